@@ -0,0 +1,590 @@
+"""Benchmarks for the DirMap and its engines.
+
+Sweeps the number of rules, path depth, hit ratio and batch size across
+:class:`dirmap.core.DirMap` (with every engine), the experimental cores in
+:mod:`dirmap.altcores`, :meth:`DirMap.deep_apply`, and (when NumPy is
+installed) :meth:`DirMap.apply_array`. Each case records the setup cost,
+lookup latency percentiles, and (where :mod:`resource` is available) the peak
+memory of setup, measured in a fresh interpreter. The cost of changing rules
+between lookups, the memory held per rule by the indexes for large rule sets
+(and by whole maps, against the original core), the overhead of
+instrumentation (see :mod:`dirmap.stats`), and the cost of importing dirmap
+in fresh interpreters, are also measured.
+
+e.g.::
+
+    # Run everything, and save the results.
+    python -m benchmarks.bench --output results.json
+
+    # Run a smaller sweep, and fail if anything got much slower.
+    python -m benchmarks.bench --quick --baseline results.json
+
+"""
+
+from __future__ import division, print_function
+
+import argparse
+import array
+import fnmatch
+import gc
+import json
+import os
+import random
+import subprocess
+import sys
+import timeit
+import types
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import dirmap
+from dirmap.core import DirMap
+from dirmap.engines import engines
+from dirmap.altcores.deferredre import DirMap as DeferredRe
+from dirmap.altcores.dicttrie import DirMap as DictTrie
+from dirmap.altcores.dictlookup import DirMap as DictLookup
+from dirmap.altcores.immediatere import DirMap as ImmediateRe
+from dirmap.altcores.lazysort import DirMap as LazySort
+
+
+timer = timeit.default_timer
+
+
+# Name -> (factory, largest rule count it is reasonable to run).
+# The scanning cores take seconds per thousand lookups past these.
+targets = {}
+for _name in sorted(engines):
+    targets['core.' + _name] = (
+        (lambda name: lambda rules: DirMap(rules, engine=name))(_name),
+        10000 if _name in ('linear', 'entry_re') else None,
+    )
+targets['core.frozen'] = (lambda rules: DirMap(rules).freeze(), None)
+targets['altcores.DeferredRe'] = (DeferredRe, 10000)
+targets['altcores.ImmediateRe'] = (ImmediateRe, 1000)
+targets['altcores.DictTrie'] = (DictTrie, None)
+targets['altcores.DictLookup'] = (DictLookup, None)
+targets['altcores.LazySort'] = (LazySort, 10000)
+
+
+full_sweep = dict(
+    rules=(10, 100, 1000, 10000, 100000),
+    depth=(4, 12),
+    hit_ratio=(0.0, 0.5, 1.0),
+    batch=(10, 1000, 100000),
+    deep=(100, 10000, 100000),
+    memory=(10000, 100000, 1000000),
+    imports=30,
+)
+
+quick_sweep = dict(
+    rules=(10, 1000),
+    depth=(6, ),
+    hit_ratio=(0.5, ),
+    batch=(1000, ),
+    deep=(1000, ),
+    memory=(10000, ),
+    imports=10,
+)
+
+
+def make_rules(count, rand):
+    """Build ``count`` rules spread over a few volumes and projects."""
+    rules = {}
+    while len(rules) < count:
+        i = len(rules)
+        src = '/Volumes/vol{}/Projects/proj{}/asset{}'.format(i % 17, i % 101, rand.randrange(1 << 30))
+        rules[src] = '/mnt/heap/{}/assets/{}'.format(i % 17, i)
+    return rules
+
+
+def make_paths(rules, count, depth, hit_ratio, rand):
+    """Build ``count`` paths ``depth`` segments deep, some fraction under a rule."""
+    srcs = sorted(rules)
+    paths = []
+    for i in range(count):
+        if rand.random() < hit_ratio:
+            base = rand.choice(srcs)
+        else:
+            base = '/Volumes/vol{}/Projects/missing{}'.format(i % 17, i)
+        parts = [base]
+        parts.extend('dir{}'.format(rand.randrange(8)) for _ in range(max(0, depth - base.count('/'))))
+        parts.append('file.{:04d}.exr'.format(i % 100))
+        paths.append('/'.join(parts))
+    return paths
+
+
+def make_payload(count, rand):
+    """Build a job-like structure holding about ``count`` strings."""
+    records = []
+    for i in range(count // 10):
+        records.append({
+            'path': '/Volumes/vol{}/Projects/proj{}/file{}.ma'.format(i % 17, i % 101, i),
+            'deps': ['/Volumes/vol{}/Projects/proj{}/dep{}'.format(i % 17, i % 101, j) for j in range(4)],
+            'frames': (1001, 1100),
+            'tags': set(['tag{}'.format(i % 5)]),
+            'meta': {'user': 'someone', 'note': 'not a path at all'},
+        })
+    return {'job': {'records': records}}
+
+
+def measure(func, number=1):
+    """Time ``number`` calls of ``func``, with the GC out of the way."""
+    gc.collect()
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = timer()
+        for _ in range(number):
+            func()
+        return (timer() - start) / number
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def measure_setup(func):
+    """Return ``(result, seconds)`` for a single call of ``func``."""
+    gc.collect()
+    start = timer()
+    result = func()
+    return result, timer() - start
+
+
+_peak_script = '''
+import gc, random, resource, sys
+from benchmarks import bench
+rand = random.Random({seed})
+
+def peak():
+    try:
+        # On Linux, that of this process alone; getrusage includes the
+        # (potentially larger) process which started us.
+        with open('/proc/self/status') as fh:
+            for line in fh:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except IOError:
+        pass
+    # Kilobytes, other than on macOS.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+{prepare}
+gc.collect()
+try:
+    # Linux can reset the peak to the current size, so that of preparing
+    # doesn't hide that of running.
+    with open('/proc/self/clear_refs', 'w') as fh:
+        fh.write('5')
+except (IOError, OSError):
+    pass
+before = peak()
+{run}
+sys.stdout.write(repr(peak() - before))
+'''
+
+
+def measure_peak(prepare, run, seed=0):
+    """The peak memory (in bytes) used by some code, beyond that of preparing for it.
+
+    Both are run in a fresh interpreter (with ``bench`` and ``rand``), and
+    the growth of its peak resident size is taken (see
+    :func:`resource.getrusage`), so this works without :mod:`tracemalloc`.
+    Memory freed by ``prepare`` may be reused by ``run`` (and, other than on
+    Linux, a higher peak while preparing hides that of running), and small
+    peaks are rounded to pages. Returns ``None`` where :mod:`resource` is
+    not available.
+
+    """
+
+    if resource is None:
+        return None
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return int(subprocess.check_output(
+        [sys.executable, '-c', _peak_script.format(seed=seed, prepare=prepare, run=run)],
+        env=dict(os.environ, PYTHONPATH=root),
+    ))
+
+
+def percentiles(samples, points=(50, 90, 99)):
+    samples = sorted(samples)
+    out = {}
+    for p in points:
+        i = min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))
+        out['p{}'.format(p)] = samples[i]
+    return out
+
+
+def measure_latency(func, paths, chunk=16, budget=0.5):
+    """Per-call latency percentiles (in ns) of ``func`` across the paths.
+
+    Calls are timed in chunks to keep the timer's own overhead out of the
+    results, and we stop early once over the time budget.
+
+    """
+
+    samples = []
+    spent = 0
+    for i in range(0, len(paths), chunk):
+        batch = paths[i:i + chunk]
+        start = timer()
+        for path in batch:
+            func(path)
+        duration = timer() - start
+        samples.append(1e9 * duration / len(batch))
+        spent += duration
+        if spent > budget and len(samples) >= 10:
+            break
+    return percentiles(samples)
+
+
+def bench_lookup(sweep, rand, select):
+
+    for count in sweep['rules']:
+
+        rules = make_rules(count, rand)
+        path_sets = []
+        for depth in sweep['depth']:
+            for hit_ratio in sweep['hit_ratio']:
+                path_sets.append((depth, hit_ratio, make_paths(rules, 1000, depth, hit_ratio, rand)))
+
+        for name, (factory, max_rules) in sorted(targets.items()):
+
+            if max_rules and count > max_rules:
+                continue
+            case = {'suite': 'lookup', 'target': name, 'rules': count}
+            if not select(case):
+                continue
+
+            # Most maps defer building their index until the first lookup.
+            def setup():
+                map_ = factory(rules)
+                map_('/')
+                return map_
+
+            map_, duration = measure_setup(setup)
+            # The rules are built anew (with the same shape) for this.
+            peak = measure_peak(
+                'rules = bench.make_rules({}, rand)'.format(count),
+                'map_ = bench.targets[{!r}][0](rules); map_("/")'.format(name),
+            )
+            for depth, hit_ratio, paths in path_sets:
+                result = dict(case, depth=depth, hit_ratio=hit_ratio)
+                result.update(setup_s=duration, setup_peak_bytes=peak)
+                result.update(measure_latency(map_, paths))
+                yield result
+
+
+def bench_batch(sweep, rand, select):
+
+    rules = make_rules(100, rand)
+    map_ = DirMap(rules)
+
+    for size in sweep['batch']:
+        paths = make_paths(rules, size, 8, 0.5, rand)
+        number = max(1, 10000 // size)
+        funcs = [
+            ('loop', lambda: [map_(p) for p in paths]),
+            ('apply_many', lambda: map_.apply_many(paths)),
+        ]
+        if numpy is not None:
+            array = numpy.array(paths)
+            funcs.append(('apply_array', lambda: map_.apply_array(array)))
+        for name, func in funcs:
+            case = {'suite': 'batch', 'target': name, 'batch': size}
+            if select(case):
+                yield dict(case, per_item_ns=1e9 * measure(func, number) / size)
+
+
+def bench_deep(sweep, rand, select):
+
+    rules = {
+        '/Volumes/vol1/Projects': '/mnt/projects',
+        '/Volumes/vol2': '/mnt/vol2',
+    }
+    map_ = DirMap(rules)
+
+    for size in sweep['deep']:
+        payload = make_payload(size, rand)
+        case = {'suite': 'deep', 'target': 'deep_apply', 'strings': size}
+        if not select(case):
+            continue
+        _, duration = measure_setup(lambda: map_.deep_apply(payload))
+        peak = measure_peak(
+            'map_ = bench.DirMap({!r}); payload = bench.make_payload({}, rand)'.format(rules, size),
+            'map_.deep_apply(payload)',
+        )
+        yield dict(case, duration_s=duration, peak_bytes=peak)
+
+
+def bench_instrument(sweep, rand, select):
+    """Lookups with instrumentation off, turned off again, and on."""
+
+    rules = make_rules(100, rand)
+    paths = make_paths(rules, 10000, 8, 0.5, rand)
+
+    def plain():
+        return DirMap(rules)
+
+    def uninstrumented():
+        map_ = DirMap(rules)
+        map_.instrument()
+        map_.uninstrument()
+        return map_
+
+    def instrumented():
+        map_ = DirMap(rules)
+        map_.instrument()
+        return map_
+
+    for name, factory in (
+        ('plain', plain),
+        ('uninstrumented', uninstrumented),
+        ('instrumented', instrumented),
+    ):
+        case = {'suite': 'instrument', 'target': name}
+        if select(case):
+            map_ = factory()
+            map_('/')
+            yield dict(case, **measure_latency(map_, paths))
+
+
+def bench_changes(sweep, rand, select):
+    """Adding (and removing) single rules, interleaved with lookups."""
+
+    for count in sweep['rules']:
+
+        rules = make_rules(count, rand)
+        extra = make_rules(100, rand)
+        paths = make_paths(rules, 100, 8, 0.5, rand)
+
+        # The original core re-sorts its rules on the first lookup after each.
+        for name in 'core.auto', 'core.trie', 'core.dict', 'core.compact', 'altcores.LazySort':
+            factory, max_rules = targets[name]
+            if max_rules and count > max_rules:
+                continue
+            case = {'suite': 'changes', 'target': name, 'rules': count}
+            if not select(case):
+                continue
+
+            map_ = factory(rules)
+            map_('/')
+
+            def change():
+                for (src, dst), path in zip(extra.iteritems(), paths):
+                    map_.add_one(src, dst)
+                    map_(path)
+                for src, path in zip(extra, paths):
+                    map_.remove(src)
+                    map_(path)
+
+            yield dict(case, per_item_ns=1e9 * measure(change) / (2 * len(extra)))
+
+
+def deep_sizeof(obj, shared=()):
+    """The total :func:`sys.getsizeof` of everything reachable from ``obj``.
+
+    Modules and classes are not counted, nor is anything in ``shared`` (e.g.
+    the strings of the rules, which the caller holds anyway).
+
+    """
+    seen = set(id(x) for x in shared)
+    stack = [obj]
+    total = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.iterkeys())
+            stack.extend(obj.itervalues())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif not isinstance(obj, (basestring, int, long, float, array.array, type(None), type, types.ModuleType)):
+            stack.extend(getattr(obj, '__dict__', {}).itervalues())
+            for cls in type(obj).__mro__:
+                stack.extend(getattr(obj, name) for name in cls.__dict__.get('__slots__', ()) if hasattr(obj, name))
+    return total
+
+
+def bench_memory(sweep, rand, select):
+    """The memory (in bytes per rule) held by large engines, and whole maps.
+
+    This counts everything reachable from the engine (including the strings
+    it shares with the rules), so doesn't need :mod:`tracemalloc`. For the
+    rules built here, the :class:`~dirmap.engines.TrieEngine` holds 450-600
+    bytes per rule, the :class:`~dirmap.engines.DictEngine` about 200 (which
+    is mostly the rules themselves), and the
+    :class:`~dirmap.engines.CompactEngine` about 130.
+
+    The ``map`` targets are a :class:`~dirmap.core.DirMap` (bulk loaded and
+    used once, so with its default index built), and the original core in
+    :mod:`dirmap.altcores.lazysort` for comparison, less the strings of the
+    rules which both share.
+
+    """
+
+    def bulk_loaded(rules):
+        map_ = DirMap()
+        map_.bulk_load(rules)
+        return map_
+
+    for count in sweep['memory']:
+
+        rules = make_rules(count, rand)
+        paths = make_paths(rules, 1000, 8, 0.5, rand)
+
+        strings = rules.keys() + rules.values()
+        for name, factory in ('core', bulk_loaded), ('LazySort', LazySort):
+            case = {'suite': 'memory', 'target': 'map.' + name, 'rules': count}
+            if not select(case):
+                continue
+
+            def setup():
+                map_ = factory(rules)
+                map_('/')
+                return map_
+
+            map_, duration = measure_setup(setup)
+            yield dict(case, setup_s=duration, bytes_per_rule=deep_sizeof(map_, strings) / count)
+            del map_
+
+        for name in 'dict', 'trie', 'compact':
+            case = {'suite': 'memory', 'target': 'core.' + name, 'rules': count}
+            if not select(case):
+                continue
+            cls = engines[name]
+            engine, duration = measure_setup(lambda: cls(rules, '/'))
+            result = dict(case, setup_s=duration, bytes_per_rule=deep_sizeof(engine) / count)
+            result.update(measure_latency(engine.match, paths))
+            del engine
+            yield result
+
+
+_import_script = '''
+import sys, time
+start = time.time()
+{}
+sys.stdout.write(repr(time.time() - start))
+'''
+
+
+def bench_import(sweep, rand, select):
+    """Time importing (and first using) dirmap in fresh interpreters.
+
+    Each result is the median over many interpreters, less that of an empty
+    script.
+
+    """
+
+    path = os.path.dirname(os.path.dirname(os.path.abspath(dirmap.__file__)))
+    env = dict(os.environ, PYTHONPATH=path)
+    env.pop('DIRMAP', None)
+
+    def run(code, extra_env={}):
+        samples = sorted(
+            float(subprocess.check_output(
+                [sys.executable, '-c', _import_script.format(code)],
+                env=dict(env, **extra_env),
+            ))
+            for _ in range(sweep['imports'])
+        )
+        return samples[len(samples) // 2]
+
+    empty = None
+    for name, code, extra_env in (
+        ('import', 'import dirmap', {}),
+        ('apply', 'import dirmap; dirmap.apply("/src/a")', {'DIRMAP': '/src:/dst'}),
+    ):
+        case = {'suite': 'import', 'target': name}
+        if not select(case):
+            continue
+        if empty is None:
+            empty = run('pass')
+        yield dict(case, duration_s=max(0, run(code, extra_env) - empty))
+
+
+suites = [bench_lookup, bench_batch, bench_deep, bench_changes, bench_memory, bench_instrument, bench_import]
+
+
+def case_key(result):
+    """Identify a result by everything which isn't a measurement."""
+    measurements = ('setup_s', 'setup_peak_bytes', 'p50', 'p90', 'p99', 'per_item_ns', 'duration_s', 'peak_bytes', 'bytes_per_rule')
+    return json.dumps(dict((k, v) for k, v in result.items() if k not in measurements), sort_keys=True)
+
+
+def compare(results, baseline, tolerance, floor_ns=200):
+    """Yield a description of every result slower than the baseline allows.
+
+    Latencies must also be ``floor_ns`` slower, so that timer noise on very
+    fast cases isn't reported.
+
+    """
+
+    old_results = dict((case_key(r), r) for r in baseline)
+    for new in results:
+        old = old_results.get(case_key(new))
+        if old is None:
+            continue
+        for field, scale in (('p50', 1), ('per_item_ns', 1), ('setup_s', 1e9), ('duration_s', 1e9)):
+            if new.get(field) is None or old.get(field) is None:
+                continue
+            a = old[field] * scale
+            b = new[field] * scale
+            if b > a * tolerance and b - a > floor_ns:
+                yield '{} {}: {:.0f} -> {:.0f} ({:.2f}x)'.format(case_key(new), field, a, b, b / a)
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-q', '--quick', action='store_true', help="run a smaller sweep")
+    parser.add_argument('-k', '--filter', help="only run targets matching this glob")
+    parser.add_argument('-o', '--output', help="write results to this JSON file")
+    parser.add_argument('-b', '--baseline', help="compare against results in this JSON file")
+    parser.add_argument('-t', '--tolerance', type=float, default=1.5,
+        help="slowdown vs the baseline considered a regression (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    sweep = quick_sweep if args.quick else full_sweep
+    rand = random.Random(args.seed)
+
+    def select(case):
+        return not args.filter or fnmatch.fnmatch('{suite}.{target}'.format(**case), args.filter)
+
+    results = []
+    for suite in suites:
+        for result in suite(sweep, rand, select):
+            print(json.dumps(result, sort_keys=True))
+            sys.stdout.flush()
+            results.append(result)
+
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+        regressions = list(compare(results, baseline, args.tolerance))
+        if regressions:
+            print('\n{} REGRESSIONS vs {}:'.format(len(regressions), args.baseline), file=sys.stderr)
+            for line in regressions:
+                print('    ' + line, file=sys.stderr)
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
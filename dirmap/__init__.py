@@ -1 +1,2 @@
 from .core import DirMap
+from .env import apply, default
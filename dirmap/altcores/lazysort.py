@@ -0,0 +1,80 @@
+"""The original core, kept as the baseline for the benchmarks.
+
+The rules are a plain dict, which is sorted (longest source first) on the
+first lookup after any change, and then scanned linearly.
+
+"""
+
+import collections
+import os
+
+
+def assert_clean(path, name="Path"):
+    if not os.path.isabs(path):
+        raise ValueError("{} must be absolute.".format(name), path)
+    if not os.path.normpath(path) == path:
+        raise ValueError("{} must be normalized.".format(name), path)
+
+
+class DirMap(collections.Mapping):
+
+    def __init__(self, input_=None):
+        self._map = {}
+        self._sorted = None
+        if input_:
+            self.add(input_)
+
+    def add_one(self, src, dst):
+        for name, path in ("Source", src), ("Destination", dst):
+            assert_clean(path, name)
+        self._map[src] = dst
+        self._sorted = None
+
+    def add(self, input_):
+        if isinstance(input_, dict):
+            input_ = input_.iteritems()
+        for src, dst in input_:
+            self.add_one(src, dst)
+
+    def remove(self, src):
+        del self._map[src]
+        self._sorted = None
+
+    def __iter__(self):
+        return iter(self._map)
+
+    def __getitem__(self, i):
+        return self._map[i]
+
+    def __len__(self):
+        return len(self._map)
+
+    def __call__(self, path):
+
+        if not isinstance(path, basestring):
+            raise ValueError("DirMap requires a string.")
+
+        # Shortcut when we are empty.
+        if not self._map:
+            return path
+
+        # Shortcut when not an abspath.
+        if not os.path.isabs(path):
+            return path
+
+        if self._sorted is None:
+            self._sorted = sorted(self._map.iteritems(), key=lambda (src, dst): (-len(src), src, dst))
+
+        for src, dst in self._sorted:
+
+            if not path.startswith(src):
+                continue
+
+            if len(src) == len(path):
+                return dst
+
+            if path[len(src)] == os.path.sep:
+                rel_path = path[len(src):]
+                return dst + rel_path
+
+        return path
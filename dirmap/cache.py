@@ -0,0 +1,82 @@
+import collections
+import threading
+
+
+CacheInfo = collections.namedtuple('CacheInfo', 'hits misses maxsize currsize')
+
+
+class LRUCache(object):
+
+    """A bounded mapping which discards the least recently used items.
+
+    This is the same structure as Python 3's :func:`functools.lru_cache`: a
+    dict pointing into a circular doubly linked list of ``[prev, next, key,
+    value]`` links, with the root link between the newest and oldest.
+
+    """
+
+    def __init__(self, maxsize):
+        if maxsize < 1:
+            raise ValueError("LRUCache requires a positive size.", maxsize)
+        self.maxsize = maxsize
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self._links = {}
+        self._root = root = []
+        root[:] = [root, root, None, None]
+
+    def clear(self):
+        """Empty the cache; the statistics are kept."""
+        with self._lock:
+            self._clear()
+
+    def info(self):
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._links))
+
+    def __len__(self):
+        return len(self._links)
+
+    def get(self, key, default=None):
+        with self._lock:
+            link = self._links.get(key)
+            if link is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            # Move the link to the front (just before the root).
+            prev, next_, _, value = link
+            prev[1] = next_
+            next_[0] = prev
+            root = self._root
+            last = root[0]
+            last[1] = root[0] = link
+            link[0] = last
+            link[1] = root
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+
+            links = self._links
+            if key in links:
+                links[key][3] = value
+                return
+
+            root = self._root
+            if len(links) >= self.maxsize:
+                # Reuse the old root to store the new item, and make the
+                # oldest link the new root.
+                oldroot = root
+                oldroot[2] = key
+                oldroot[3] = value
+                root = self._root = oldroot[1]
+                del links[root[2]]
+                root[2] = root[3] = None
+                links[key] = oldroot
+            else:
+                last = root[0]
+                link = [last, root, key, value]
+                last[1] = root[0] = links[key] = link
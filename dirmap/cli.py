@@ -0,0 +1,211 @@
+"""The ``dirmap`` command.
+
+e.g.::
+
+    # Remap a list of paths.
+    find /src -type f | dirmap map -r /src:/dst
+
+    # Remap a NUL-delimited manifest with rules from a file, in parallel.
+    dirmap map -0 -f rules.txt -j 8 manifest.bin > remapped.bin
+
+    # Remap paths within Maya scenes.
+    dirmap rewrite -r /src:/dst -i '*.ma' scenes/
+
+    # Remap strings (including keys) within a JSON document.
+    dirmap json -r /src:/dst --keys job.json > remapped.json
+
+"""
+
+from __future__ import print_function
+
+import argparse
+import collections
+import multiprocessing
+import sys
+
+from .core import DirMap
+from .engines import engines
+from .json_stream import chunk_size, remap as remap_json
+from .parallel import snapshot
+from .rewrite import rewrite_paths
+
+
+def iter_blocks(fh, delim, size=None):
+    """Yield ``(block, terminated)`` read from the given file in large chunks.
+
+    Each block holds whole records, and does not include its final
+    delimiter; ``terminated`` is only false for the final block of an input
+    which does not end with a delimiter.
+
+    """
+
+    size = size or chunk_size
+    tail = ''
+    while True:
+        chunk = fh.read(size)
+        if not chunk:
+            break
+        end = chunk.rfind(delim)
+        if end < 0:
+            tail += chunk
+            continue
+        yield tail + chunk[:end], True
+        tail = chunk[end + len(delim):]
+    if tail:
+        yield tail, False
+
+
+def _map_block(map_, block, terminated, delim):
+    out = delim.join(map_.apply_many(block.split(delim)))
+    return out + delim if terminated else out
+
+
+_worker_map = None
+
+def _init_worker(map_):
+    global _worker_map
+    _worker_map = map_
+
+def _map_block_in_worker(block, terminated, delim):
+    return _map_block(_worker_map, block, terminated, delim)
+
+
+def remap_stream(map_, in_fh, out_fh, delim='\n', jobs=None):
+    """Map every delimited path read from ``in_fh``, and write them to ``out_fh``.
+
+    The input is processed in blocks, so arbitrarily large inputs are handled
+    in constant memory. If ``jobs`` is more than one, the blocks are mapped
+    in that many worker processes, and written in their original order.
+
+    """
+
+    map_ = snapshot(map_)
+    blocks = iter_blocks(in_fh, delim)
+    write = out_fh.write
+
+    if not jobs or jobs < 2:
+        for block, terminated in blocks:
+            write(_map_block(map_, block, terminated, delim))
+        return
+
+    pool = multiprocessing.Pool(jobs, _init_worker, (map_, ))
+    try:
+        # Only keep a couple of blocks in flight per worker, so that we don't
+        # read far ahead of what has been written.
+        pending = collections.deque()
+        for block, terminated in blocks:
+            if len(pending) >= 2 * jobs:
+                write(pending.popleft().get())
+            pending.append(pool.apply_async(_map_block_in_worker, (block, terminated, delim)))
+        while pending:
+            write(pending.popleft().get())
+        pool.close()
+    finally:
+        pool.terminate()
+
+
+def load_rules(map_, path):
+    """Add rules from a file, which has one :meth:`DirMap.add_str` spec per line.
+
+    Blank lines, and those starting with ``#``, are ignored.
+
+    """
+    with open(path) as fh:
+        for line in fh:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                map_.add_str(line)
+
+
+def build_map(args):
+    map_ = DirMap(engine=args.engine)
+    for spec in args.rules:
+        map_.add_str(spec)
+    for path in args.rules_files:
+        load_rules(map_, path)
+    return map_
+
+
+def add_rule_arguments(parser):
+    parser.add_argument('-r', '--rules', action='append', default=[], metavar='SPEC',
+        help="rules in DirMap.add_str syntax; e.g. /src:/dst;/src2:/dst2")
+    parser.add_argument('-f', '--rules-file', dest='rules_files', action='append', default=[], metavar='PATH',
+        help="file of rules, one DirMap.add_str spec per line")
+    parser.add_argument('--engine', choices=sorted(engines), default='auto')
+
+
+def main_map(args):
+
+    map_ = build_map(args)
+    delim = '\0' if args.null else '\n'
+    out_fh = sys.stdout
+
+    for path in args.inputs or ['-']:
+        if path == '-':
+            remap_stream(map_, sys.stdin, out_fh, delim, args.jobs)
+        else:
+            with open(path, 'rb') as in_fh:
+                remap_stream(map_, in_fh, out_fh, delim, args.jobs)
+
+    out_fh.flush()
+
+
+def main_rewrite(args):
+    map_ = build_map(args)
+    for path, count in rewrite_paths(map_, args.paths, args.include, args.jobs):
+        if count and args.verbose:
+            print('{} {}'.format(count, path))
+
+
+def main_json(args):
+    map_ = build_map(args)
+    if args.input == '-':
+        remap_json(map_, sys.stdin, sys.stdout, args.keys, args.embedded)
+    else:
+        with open(args.input, 'rb') as in_fh:
+            remap_json(map_, in_fh, sys.stdout, args.keys, args.embedded)
+    sys.stdout.flush()
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(prog='dirmap', description="Remap paths from one layout to another.")
+    subparsers = parser.add_subparsers()
+
+    map_parser = subparsers.add_parser('map', help="remap a stream of paths")
+    add_rule_arguments(map_parser)
+    map_parser.add_argument('-0', '--null', action='store_true',
+        help="paths are delimited by NUL rather than newlines")
+    map_parser.add_argument('-j', '--jobs', type=int,
+        help="map in this many worker processes")
+    map_parser.add_argument('inputs', nargs='*', metavar='INPUT',
+        help="files of paths to remap; defaults to stdin")
+    map_parser.set_defaults(func=main_map)
+
+    rewrite_parser = subparsers.add_parser('rewrite', help="remap paths embedded within files, in place")
+    add_rule_arguments(rewrite_parser)
+    rewrite_parser.add_argument('-i', '--include', action='append', metavar='GLOB',
+        help="only rewrite files within directories matching this pattern")
+    rewrite_parser.add_argument('-j', '--jobs', type=int,
+        help="rewrite in this many worker processes")
+    rewrite_parser.add_argument('-v', '--verbose', action='store_true',
+        help="print the number of paths replaced in each changed file")
+    rewrite_parser.add_argument('paths', nargs='+', metavar='PATH',
+        help="files, or directories of them, to rewrite")
+    rewrite_parser.set_defaults(func=main_rewrite)
+
+    json_parser = subparsers.add_parser('json', help="remap strings within a JSON document")
+    add_rule_arguments(json_parser)
+    json_parser.add_argument('-k', '--keys', action='store_true',
+        help="remap object keys as well as values")
+    json_parser.add_argument('-e', '--embedded', action='store_true',
+        help="remap paths found anywhere within strings")
+    json_parser.add_argument('input', nargs='?', default='-', metavar='INPUT',
+        help="the JSON file; defaults to stdin")
+    json_parser.set_defaults(func=main_json)
+
+    args = parser.parse_args(argv)
+    if not (args.rules or args.rules_files):
+        parser.error("at least one of --rules or --rules-file is required")
+
+    return args.func(args)
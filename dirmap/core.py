@@ -1,16 +1,502 @@
 import collections
 import os
+import sys
+import thread
 
-from .deep import deep_apply as _deep_apply
+from .persistent import PersistentDict
 
 
-def assert_clean(path, name="Path"):
-    if not os.path.isabs(path):
+_fs_encoding = sys.getfilesystemencoding() or 'utf-8'
+
+
+def _convert(path, type_):
+    """Encode or decode the path to the given string type if required."""
+    if isinstance(path, unicode):
+        return path if issubclass(type_, unicode) else path.encode(_fs_encoding)
+    return path.decode(_fs_encoding) if issubclass(type_, unicode) else path
+
+
+def _fspath(path):
+    """Get the string from a path-like object (e.g. :mod:`pathlib`), or None."""
+    fspath = getattr(type(path), '__fspath__', None)
+    if fspath is not None:
+        return fspath(path)
+
+
+def _root(path, flavor):
+    """Get the root (e.g. ``'/'``) which the indexes hold as the given path, or None.
+
+    Roots are held without their separator, so that they match (and join
+    the rest of a path) like any other directory; see :func:`_convert_rules`.
+
+    """
+    sep = flavor.sep
+    if flavor.isabs(path):
+        # Other than the roots of UNC shares, they aren't absolute without it.
+        if path[:2] != sep + sep or flavor.normpath(path + sep) != path + sep:
+            return None
+    return path + sep
+
+
+def _join(dst, src, rest, flavor, dst_flavor, convert=None):
+    """Join the destination of a match to the rest of the path after its source.
+
+    The path is only the destination if it was the whole of the source (or
+    of the root, with its separator), which is then a root if it was one.
+
+    """
+    if not rest or (len(rest) == 1 and _root(src, flavor) is not None):
+        return _root(dst, dst_flavor) or dst
+    return dst + (rest if convert is None else convert(rest))
+
+
+def _convert_rules(rules, type_, flavor, dst_flavor, keys=None, form='index'):
+    """Convert rules to the form the indexes hold them in.
+
+    The paths are converted to the type, and the sources are folded by the
+    flavor. Roots (e.g. ``'/'`` or ``'Z:\\'``) are held without their
+    separator; see :func:`_join`. The ``"automaton"`` form keeps it on the
+    sources which aren't absolute without it (e.g. ``'Z:\\'``), as their own
+    boundary, and the ``"exact"`` form keeps it on both sides (with the
+    sources which are, i.e. UNC shares, also held without it).
+
+    :param keys: Only convert the rules of these sources, returning
+        ``({src: dst}, [src])`` of the rules to add, and the sources to
+        remove (those which are no longer in the rules).
+
+    """
+
+    fold = flavor.fold if flavor.folds else None
+    sep = _convert(flavor.sep, type_)
+    dst_sep = _convert(dst_flavor.sep, type_)
+    added = {}
+    removed = []
+
+    items = rules.iteritems() if keys is None else ((src, rules.get(src)) for src in keys)
+    for src, dst in items:
+
+        src = _convert(src, type_)
+        if fold is not None:
+            src = fold(src)
+        if dst is not None:
+            dst = _convert(dst, type_)
+
+        if src[-1:] != sep and (dst is None or dst[-1:] != dst_sep):
+            if dst is None:
+                removed.append(src)
+            else:
+                added[src] = dst
+            continue
+
+        srcs = [src]
+        if src[-1:] == sep:
+            if form == 'index':
+                srcs = [src[:-1]]
+            elif flavor.isabs(src[:-1]):
+                srcs = [src[:-1]] if form == 'automaton' else [src[:-1], src]
+        if dst is None:
+            removed.extend(srcs)
+            continue
+        if dst[-1:] == dst_sep and form != 'exact':
+            dst = dst[:-1]
+        for src in srcs:
+            added[src] = dst
+
+    return added if keys is None else (added, removed)
+
+
+def assert_clean(path, name="Path", flavor=None):
+    flavor = flavor or os.path
+    if not flavor.isabs(path):
         raise ValueError("{} must be absolute.".format(name), path)
-    if not os.path.normpath(path) == path:
+    if not flavor.normpath(path) == path:
         raise ValueError("{} must be normalized.".format(name), path)
 
 
+def _split_rule(chunk):
+    """Split a ``src:dst`` chunk of a spec on its colons, other than those of drive letters."""
+    parts = []
+    start = 0
+    pos = chunk.find(':')
+    while pos >= 0:
+        # e.g. the colon of "Z:\\" or "Z:/"
+        is_drive = pos == start + 1 and chunk[start].isalpha() and chunk[pos + 1:pos + 2] in ('\\', '/')
+        if not is_drive:
+            parts.append(chunk[start:pos])
+            start = pos + 1
+        pos = chunk.find(':', pos + 1)
+    parts.append(chunk[start:])
+    return parts
+
+
+def preferred_source(src):
+    """Sort key for which of many sources sharing a destination to reverse to.
+
+    The shortest source wins (as the most general), and then the first in
+    lexicographic order.
+
+    """
+    return len(src), src
+
+
+class _State(object):
+
+    """One version of the rules, and everything derived from them.
+
+    The rules of a state never change once it is published; a
+    :class:`DirMap` copies the current state, changes the copy, and then
+    publishes it. Readers take the current state once, so they always see a
+    consistent set of rules, indexes and caches without locking. The indexes
+    are built lazily, and may be built twice by racing threads, but they are
+    the same either way.
+
+    Alongside the rules is their inverse, ``{dst: src}``, which is built on
+    first use (see :meth:`get_inverse`), and then updated along with them.
+    Where many sources share a destination, the :func:`preferred_source`
+    wins, and the others are kept in ``sources`` in case it is changed.
+
+    The indexes hold the rules with their sources folded by their
+    :mod:`~dirmap.flavors`, and paths are folded the same way to look them
+    up, so the matched length of the one is that of the other. Sources which
+    fold the same are the same source, so setting one replaces the other;
+    ``folded`` maps them back to the one in the rules.
+
+    Each of those is a :class:`~dirmap.persistent.PersistentDict`, which a
+    new state copies from the old in constant time, so that a change costs
+    time proportional to the depth of their trees rather than the number of
+    rules. The sources and destinations which were changed from the previous
+    state are kept, so that its indexes may be changed to make ours, rather
+    than being rebuilt; see :meth:`inherit`.
+
+    """
+
+    __slots__ = (
+        'map', 'inverse', 'sources', 'folded', 'changed', 'inverse_changed', 'engine',
+        'flavor', 'dst_flavor', 'fold', 'to_dst', 'to_src',
+        'indexes', 'inverse_indexes', 'automata', 'exact', 'cache', 'dirs', 'empty',
+    )
+
+    def __init__(self, engine, flavor, dst_flavor, old=None):
+
+        self.engine = engine
+        self.map = old.map.copy() if old else PersistentDict()
+        self.inverse = self.sources = None
+        if old is not None and old.inverse is not None:
+            self.sources = old.sources.copy()
+            self.inverse = old.inverse.copy()
+        self.changed = set()
+        self.inverse_changed = set()
+
+        self.flavor = flavor
+        self.dst_flavor = dst_flavor
+        self.fold = flavor.fold if flavor.folds else None
+        self.folded = None
+        if self.fold is not None:
+            self.folded = old.folded.copy() if old else PersistentDict()
+        self.to_dst = self.to_src = None
+        if flavor.sep != dst_flavor.sep:
+            self.to_dst = lambda tail: flavor.to_sep(tail, dst_flavor.sep)
+            self.to_src = lambda tail: dst_flavor.to_sep(tail, flavor.sep)
+
+        self.indexes = {}
+        self.inverse_indexes = {}
+        self.automata = {}
+        self.exact = {}
+        self.cache = None
+        self.dirs = None
+        self.empty = True
+
+    def set(self, src, dst):
+        """Set one rule; only for states which have not been published."""
+
+        folded = self.folded
+        if folded is not None:
+            key = self.folded_key(src)
+            existing = folded.get(key)
+            if existing is not None and existing != src:
+                self.remove(existing)
+            folded[key] = src
+
+        old = self.map.get(src)
+        if old == dst:
+            return
+        self.map[src] = dst
+        self.changed.add(src)
+        if self.inverse is None:
+            return
+        self.inverse_changed.add(dst)
+
+        if old is not None:
+            self._unset_inverse(src, old)
+
+        current = self.inverse.get(dst)
+        if current is None:
+            self.inverse[dst] = src
+        else:
+            srcs = self.sources.get(dst) or frozenset((current, ))
+            self._set_sources(dst, srcs | frozenset((src, )), min(current, src, key=preferred_source))
+
+    def remove(self, src):
+        """Remove one rule; only for states which have not been published.
+
+        :raises KeyError: if there is no rule for the source.
+
+        """
+
+        folded = self.folded
+        if folded is not None:
+            src = folded.pop(self.folded_key(src))
+
+        dst = self.map.pop(src)
+        self.changed.add(src)
+        if self.inverse is not None:
+            self._unset_inverse(src, dst)
+
+    def folded_key(self, src):
+        # As the indexes hold it, so that roots with and without their
+        # separator (which UNC shares may be) are the same source.
+        key = self.fold(src)
+        return key[:-1] if key[-1:] == self.flavor.sep else key
+
+    def _unset_inverse(self, src, dst):
+        self.inverse_changed.add(dst)
+        srcs = self.sources.get(dst)
+        if srcs is None:
+            del self.inverse[dst]
+        else:
+            current = self.inverse[dst]
+            self._set_sources(dst, srcs - frozenset((src, )), None if current == src else current)
+
+    def _set_sources(self, dst, srcs, preferred=None):
+        # The sets are replaced rather than changed, since they are shared
+        # with previous states.
+        if len(srcs) > 1:
+            self.sources[dst] = srcs
+        else:
+            self.sources.pop(dst, None)
+        self.inverse[dst] = preferred if preferred is not None else min(srcs, key=preferred_source)
+
+    def get_inverse(self):
+        """Get the inverse of the rules, building it (and ``sources``) if required."""
+
+        inverse = self.inverse
+        if inverse is not None:
+            return inverse
+
+        inverse = {}
+        sources = {}
+        for src, dst in self.map.iteritems():
+            current = inverse.setdefault(dst, src)
+            if current != src:
+                sources.setdefault(dst, set((current, ))).add(src)
+        for dst, srcs in sources.iteritems():
+            inverse[dst] = min(srcs, key=preferred_source)
+            sources[dst] = frozenset(srcs)
+
+        # Writers copy these once the inverse is set, so it is set last.
+        self.sources = PersistentDict(sources)
+        self.inverse = inverse = PersistentDict(inverse)
+        return inverse
+
+    def convert_rules(self, type_, keys=None, inverse=False, form='index'):
+        """Get the rules (or the changes to the given keys) in the form the indexes hold them.
+
+        See :func:`_convert_rules`; the inverse rules are of the destination
+        flavor.
+
+        """
+        if inverse:
+            return _convert_rules(self.get_inverse(), type_, self.dst_flavor, self.flavor, keys, form)
+        return _convert_rules(self.map, type_, self.flavor, self.dst_flavor, keys, form)
+
+    def inherit(self, old):
+        """Get the indexes which the old state had built, by changing theirs.
+
+        Engines which can't be changed are left to be rebuilt on first use,
+        as are inverse indexes which have lost a destination which may fold
+        the same as another.
+
+        """
+
+        for type_, index in old.indexes.items():
+            index = index.changed(*self.convert_rules(type_, self.changed))
+            if index is not None:
+                self.indexes[type_] = index
+
+        # The old inverse may have been built (by a reader) after ours was
+        # copied from it; then ours is built anew too.
+        inverse_indexes = old.inverse_indexes.items() if self.inverse is not None else ()
+        for type_, index in inverse_indexes:
+            added, removed = self.convert_rules(type_, self.inverse_changed, inverse=True)
+            if not (removed and self.dst_flavor.folds):
+                index = index.changed(added, removed)
+                if index is not None:
+                    self.inverse_indexes[type_] = index
+
+        for type_, exact in old.exact.items():
+            added, removed = self.convert_rules(type_, self.changed, form='exact')
+            # The first change moves these into a shared structure too.
+            exact = exact.copy() if isinstance(exact, PersistentDict) else PersistentDict(exact)
+            for src in removed:
+                exact.pop(src, None)
+            exact.update(added)
+            self.exact[type_] = exact
+
+    def index(self, type_=str):
+        index = self.indexes.get(type_)
+        if index is None:
+            index = self.indexes[type_] = self.engine(self.convert_rules(type_), _convert(self.flavor.sep, type_))
+        return index
+
+    def inverse_index(self, type_=str):
+        index = self.inverse_indexes.get(type_)
+        if index is None:
+            index = self.inverse_indexes[type_] = self.engine(
+                self.convert_rules(type_, inverse=True),
+                _convert(self.dst_flavor.sep, type_),
+            )
+        return index
+
+    def automaton(self, type_):
+        automaton = self.automata.get(type_)
+        if automaton is None:
+            from .embedded import Automaton
+            rules = self.convert_rules(type_, form='automaton')
+            automaton = self.automata[type_] = Automaton(rules, _convert(self.flavor.sep, type_))
+        return automaton
+
+    def replace_embedded(self, text):
+        fold = self.fold
+        return self.automaton(type(text)).replace(text, None if fold is None else fold(text), self.join)
+
+    def join(self, dst, src, rest):
+        return _join(dst, src, rest, self.flavor, self.dst_flavor, self.to_dst)
+
+    def lookup(self, path):
+        """Find the mapped version of the given path, or None if nothing applies."""
+
+        index = self.indexes.get(type(path)) or self.index(type(path))
+        fold = self.fold
+        key = path if fold is None else fold(path)
+        match = index.match(key)
+        if match is not None:
+            dst, end = match
+            rest = path[end:]
+            if len(rest) > 1:
+                to_dst = self.to_dst
+                return dst + (rest if to_dst is None else to_dst(rest))
+            return _join(dst, key[:end], rest, self.flavor, self.dst_flavor, self.to_dst)
+
+    def reverse_lookup(self, path):
+        """Find the source version of the given path, or None if nothing applies."""
+
+        index = self.inverse_indexes.get(type(path)) or self.inverse_index(type(path))
+        fold = self.dst_flavor.fold if self.dst_flavor.folds else None
+        key = path if fold is None else fold(path)
+        match = index.match(key)
+        if match is not None:
+            src, end = match
+            rest = path[end:]
+            if len(rest) > 1:
+                to_src = self.to_src
+                return src + (rest if to_src is None else to_src(rest))
+            return _join(src, key[:end], rest, self.dst_flavor, self.flavor, self.to_src)
+
+    def lookup_uncached(self, path):
+        dirs = self.dirs
+        if dirs is None:
+            return self.lookup(path)
+        return self.lookup_via_dir(path, dirs)
+
+    def lookup_via_dir(self, path, dirs):
+        """Find the mapped version of the path via the mapping of its parent.
+
+        The result only depends upon the longest source which is a prefix of
+        the path, which is either the path itself or a prefix of its parent.
+
+        """
+
+        fold = self.fold
+        key = path if fold is None else fold(path)
+
+        # The rules as the indexes hold them, as sources may only equal the
+        # path once converted to its type.
+        exact = self.exact.get(type(path))
+        if exact is None:
+            exact = self.exact[type(path)] = self.convert_rules(type(path), form='exact')
+        dst = exact.get(key)
+        if dst is not None:
+            return dst
+
+        end = key.rfind(self.flavor.sep)
+        if end < 0:
+            return
+        head = path[:end]
+        try:
+            mapped = dirs[head]
+        except KeyError:
+            if key[end - 1:end] == self.flavor.sep:
+                # e.g. the root of "//a", which maps differently when whole.
+                return self.lookup(path)
+            mapped = self.lookup(head)
+            if mapped is not None:
+                # Roots (e.g. "Z:\\") are joined to the rest without their separator.
+                if _root(mapped[:-1], self.dst_flavor) == mapped:
+                    mapped = mapped[:-1]
+                # Many heads may map to the same directory; only keep one copy.
+                if type(mapped) is str:
+                    mapped = intern(mapped)
+            dirs[head] = mapped
+
+        if mapped is not None:
+            if type(mapped) is not type(path):
+                # Equal byte and unicode strings share cache entries.
+                mapped = _convert(mapped, type(path))
+            to_dst = self.to_dst
+            return mapped + (path[end:] if to_dst is None else to_dst(path[end:]))
+
+
+class _Batch(object):
+
+    """The context manager of :meth:`DirMap.batch`.
+
+    The write lock is only taken by the outermost batch of a thread, which
+    creates the pending state, and publishes it if nothing was raised.
+
+    """
+
+    __slots__ = ('map', 'outer')
+
+    def __init__(self, map_):
+        self.map = map_
+        self.outer = False
+
+    def __enter__(self):
+        map_ = self.map
+        ident = thread.get_ident()
+        if map_._writer != ident:
+            map_._write_lock.acquire()
+            try:
+                map_._pending = _State(map_._engine, map_._flavor, map_._dst_flavor, map_._state)
+            except:
+                map_._write_lock.release()
+                raise
+            map_._writer = ident
+            self.outer = True
+
+    def __exit__(self, type_, value, traceback):
+        map_ = self.map
+        if not self.outer:
+            return
+        try:
+            if type_ is None:
+                map_._state = map_._publish(map_._pending, map_._state)
+        finally:
+            map_._pending = None
+            map_._writer = None
+            map_._write_lock.release()
+
+
 class DirMap(collections.Mapping):
 
     """Remaps directories from one layout to another.
@@ -24,20 +510,156 @@ class DirMap(collections.Mapping):
         >>> dirmap('/src/something')
         '/dst/something'
 
+    Paths may be byte or unicode strings, or path-like objects (e.g. from
+    :mod:`pathlib`), and are returned as the same type. The rules are encoded
+    or decoded (with the filesystem encoding) once per type, rather than
+    every path being converted to match the rules.
+
+    Many threads may use a map while another adds rules to it. Readers never
+    block; they see the rules from either before or after each change (or
+    :meth:`DirMap.batch` of changes), never a mix of the two.
+
+    :param input_: Rules to pass to :meth:`DirMap.add`.
+    :param engine: Name (or class) of the lookup structure to use; see
+        :mod:`dirmap.engines`. The default ``"auto"`` picks one based upon
+        the number of rules and how the map is used.
+    :param int cache_size: Remember this many of the most recently mapped
+        paths; see :meth:`DirMap.cache_info`.
+    :param bool dir_cache: Remember the mapping of every parent directory
+        seen, so that mapping sibling files costs a single dict lookup. This
+        is unbounded, so suits maps which see many files in few directories.
+    :param flavor: Name (or instance) of the style of the source paths, e.g.
+        ``"nt"`` or ``"posix-ci"``; see :mod:`dirmap.flavors`. Defaults to
+        that of this platform.
+    :param dst_flavor: The style of the destination paths, which defaults to
+        the ``flavor``. The separators of mapped paths are converted.
+
     """
 
-    def __init__(self, input_=None):
-        self._map = {}
-        self._sorted = None
+    def __init__(self, input_=None, engine='auto', cache_size=None, dir_cache=False,
+        flavor=None, dst_flavor=None
+    ):
+        # These are imported here, so that tools which only might map paths
+        # pay little to import dirmap.
+        from .engines import get_engine
+        from .flavors import get_flavor
+        self._engine = get_engine(engine)
+        self._cache_size = cache_size
+        self._dir_cache = dir_cache
+        self._flavor = get_flavor(flavor)
+        self._dst_flavor = get_flavor(dst_flavor) if dst_flavor else self._flavor
+        self._isabs = self._flavor.isabs
+        self._write_lock = thread.allocate_lock()
+        self._writer = None
+        self._pending = None
+        self._stats = None
+        self._state = self._publish(_State(self._engine, self._flavor, self._dst_flavor))
         if input_:
             self.add(input_)
 
+    def __reduce__(self):
+        # Only the rules and settings; the lock and caches are rebuilt.
+        return type(self), (
+            dict(self._state.map), self._engine, self._cache_size, self._dir_cache,
+            self._flavor.name, self._dst_flavor.name,
+        )
+
+    def _publish(self, state, old=None):
+        """Ready a new state for use."""
+
+        if self._cache_size:
+            from .cache import LRUCache
+            state.cache = LRUCache(self._cache_size)
+            if old is not None:
+                # The statistics are kept across changes.
+                state.cache.hits = old.cache.hits
+                state.cache.misses = old.cache.misses
+        if self._dir_cache:
+            state.dirs = {}
+        state.empty = not state.map
+
+        # Maps which are in use get their indexes changed here, rather than
+        # rebuilt by (potentially many of) their readers.
+        if old is not None:
+            state.inherit(old)
+        # Those changes are only needed for that, and may be every rule.
+        state.changed = state.inverse_changed = None
+
+        return state
+
+    def batch(self):
+        """Context manager to make many changes, which are published at once.
+
+        Within the batch, readers (including this thread) continue to see the
+        rules from before it. If the block raises an exception then none of
+        its changes are made. Batches may be nested, and only one thread may
+        be making changes at a time.
+
+        e.g.::
+
+            >>> with dirmap.batch():
+            ...     dirmap.add_one('/src1', '/dst1')
+            ...     dirmap.add_one('/src2', '/dst2')
+
+        """
+        return _Batch(self)
+
     def add_one(self, src, dst):
-        """Add a single direct source to destination mapping."""
-        for name, path in ("Source", src), ("Destination", dst):
-            assert_clean(path, name)
-        self._map[src] = dst
-        self._sorted = None
+        """Add a single direct source to destination mapping.
+
+        Each call outside of a :meth:`DirMap.batch` publishes a new version
+        of the rules, which shares all but the changed parts with the last,
+        so adding many rules is still faster in one (or via
+        :meth:`DirMap.bulk_load`). The indexes of the map are changed rather
+        than rebuilt, where their engine allows; see :mod:`dirmap.engines`.
+
+        In case-insensitive flavors, this replaces any rule whose source
+        differs only by case.
+
+        """
+        assert_clean(src, "Source", self._flavor)
+        assert_clean(dst, "Destination", self._dst_flavor)
+        with self.batch():
+            self._pending.set(src, dst)
+
+    def bulk_load(self, pairs):
+        """Add many rules at once, e.g. the millions from a migration.
+
+        This validates and adds every rule in a single pass, as one
+        :meth:`DirMap.batch`, so the indexes are built (or changed) once. If
+        any rule is invalid, none are added.
+
+        :param pairs: An iterable of ``(src, dst)`` tuples, or a dict.
+
+        """
+
+        if isinstance(pairs, dict):
+            pairs = pairs.iteritems()
+
+        flavor = self._flavor
+        dst_flavor = self._dst_flavor
+        with self.batch():
+            set_ = self._pending.set
+            for src, dst in pairs:
+                assert_clean(src, "Source", flavor)
+                assert_clean(dst, "Destination", dst_flavor)
+                set_(src, dst)
+
+    def remove(self, src):
+        """Remove the rule for the given source.
+
+        :raises KeyError: if there is no such rule.
+
+        """
+        with self.batch():
+            self._pending.remove(src)
+
+    def discard(self, src):
+        """Remove the rule for the given source, if there is one."""
+        try:
+            self.remove(src)
+        except KeyError:
+            pass
 
     def add(self, input_, dst=None):
 
@@ -45,6 +667,11 @@ class DirMap(collections.Mapping):
             self.add_one(input_, dst)
             return
 
+        with self.batch():
+            self._add(input_)
+
+    def _add(self, input_):
+
         if isinstance(input_, (set, basestring)):
             input_ = [input_]
 
@@ -83,21 +710,22 @@ class DirMap(collections.Mapping):
 
         """
 
-        for chunk in input_.split(';'):
+        with self.batch():
+            for chunk in input_.split(';'):
 
-            if not chunk:
-                continue
+                if not chunk:
+                    continue
 
-            parts = chunk.split(',')
-            if len(parts) > 1:
-                self.add_existing(parts)
-                continue
+                parts = chunk.split(',')
+                if len(parts) > 1:
+                    self.add_existing(parts)
+                    continue
 
-            parts = chunk.split(':')
-            if len(parts) != 2:
-                raise ValueError("More than one colon in chunk.", chunk)
-            
-            self.add_one(*parts)
+                parts = _split_rule(chunk)
+                if len(parts) != 2:
+                    raise ValueError("More than one colon in chunk.", chunk)
+                
+                self.add_one(*parts)
 
 
     def add_existing(self, paths, *args):
@@ -108,11 +736,16 @@ class DirMap(collections.Mapping):
         elif args:
             raise ValueError("Please provide an iterable or positional args, not both.")
 
+        paths = list(paths)
+        for p in paths:
+            assert_clean(p, flavor=self._flavor)
+
+        from . import probe
         srcs = set()
         dsts = set()
+        exists = probe.exists_many(paths)
         for p in paths:
-            assert_clean(p)
-            (dsts if os.path.exists(p) else srcs).add(p)
+            (dsts if exists[p] else srcs).add(p)
         
         if len(dsts) != 1:
             raise ValueError("Not exactly one of given paths exists.", paths)
@@ -120,47 +753,170 @@ class DirMap(collections.Mapping):
             raise ValueError("Only given one path.")
         dst = dsts.pop()
         
-        for src in srcs:
-            self.add_one(src, dst)
+        with self.batch():
+            for src in srcs:
+                self.add_one(src, dst)
 
     def __iter__(self):
-        return iter(self._map)
+        return iter(self._state.map)
 
     def __getitem__(self, i):
-        return self._map[i]
+        return self._state.map[i]
 
     def __len__(self):
-        return len(self._map)
+        return len(self._state.map)
 
-    def __call__(self, path):
+    def __call__(self, path, embedded=False):
+        return self._call(self._state, path, embedded)
+
+    def _call(self, state, path, embedded):
 
         if not isinstance(path, basestring): 
-            raise ValueError("DirMap requires a string.")
+            return self._call_fspath(state, path, embedded)
 
         # Shortcut when we are empty.
-        if not self._map: 
+        if state.empty: 
             return path
 
+        if embedded:
+            return state.replace_embedded(path)
+
         # Shotcut when not an abspath.
-        if not os.path.isabs(path):
+        if not self._isabs(path):
             return path
 
-        if self._sorted is None:
-            self._sorted = sorted(self._map.iteritems(), key=lambda (src, dst): (-len(src), src, dst))
+        cache = state.cache
+        if cache is not None:
+            mapped = cache.get(path)
+            if mapped is None:
+                mapped = state.lookup_uncached(path) or path
+                cache.set(path, mapped)
+            elif type(mapped) is not type(path):
+                # Equal byte and unicode strings share cache entries.
+                mapped = _convert(mapped, type(path))
+            return mapped
+
+        mapped = state.lookup_uncached(path)
+        return path if mapped is None else mapped
+
+    def _call_fspath(self, state, path, embedded):
+        raw = _fspath(path)
+        if not isinstance(raw, basestring):
+            raise ValueError("DirMap requires a string or path-like object.")
+        mapped = self._call(state, raw, embedded)
+        return path if mapped is raw else type(path)(mapped)
+
+    def _assert_exact(self, action):
+        # Frozen maps and rewritten files match paths exactly as they are.
+        from .flavors import native
+        if self._flavor is not native or self._dst_flavor is not native or native.folds:
+            raise ValueError("Only maps of the native flavor, which does not fold paths, may be {}.".format(action))
+
+    def freeze(self):
+        """Get an immutable snapshot of this map, compiled for fast lookups.
+
+        :return: A :class:`~dirmap.frozen.FrozenDirMap`, which may be shared
+            between threads without locking, hashed, and cheaply pickled.
+        :raises ValueError: if the map is not of the native flavor, or it
+            folds paths (as on Windows).
+
+        """
+        from .engines import AutoEngine
+        from .frozen import FrozenDirMap
+        self._assert_exact('frozen')
+        state = self._state
+        index = state.indexes.get(str)
+        if index is not None and not isinstance(index, AutoEngine):
+            return FrozenDirMap(state.map, index)
+        return FrozenDirMap(state.map, engine=None if self._engine is AutoEngine else self._engine)
+
+    def cache_info(self):
+        """Get statistics of the result cache, for sizing it.
+
+        :return: A ``CacheInfo(hits, misses, maxsize, currsize)`` namedtuple,
+            or ``None`` if the map was not created with a ``cache_size``.
 
-        for src, dst in self._sorted:
+        """
+        cache = self._state.cache
+        if cache is not None:
+            return cache.info()
+
+    def instrument(self, stats=None):
+        """Start counting which rules are used, and timing lookups.
+
+        This costs nothing until called; see :mod:`dirmap.stats`.
+
+        :param stats: The :class:`~dirmap.stats.Stats` to record into, e.g.
+            to share one between maps.
+        :return: The :class:`~dirmap.stats.Stats`.
+
+        """
+        from .stats import instrument
+        if self._stats is not None:
+            self.uninstrument()
+        return instrument(self, stats)
+
+    def uninstrument(self):
+        """Stop recording, returning the :class:`~dirmap.stats.Stats` (if any)."""
+        if self._stats is not None:
+            from .stats import uninstrument
+            return uninstrument(self)
+
+    def iter_apply(self, paths):
+        """Lazily apply the dirmap to every path in the given iterable.
+
+        Paths are grouped by their parent directory, so the rules are scanned
+        once per unique directory within the batch (or within the life of the
+        map if it has a ``dir_cache``) rather than once per path.
+        Results are yielded in the same order as the input, and all use the
+        rules from when iteration started.
+
+        """
+
+        state = self._state
+        empty = state.empty
+        dirs = state.dirs
+        if dirs is None:
+            dirs = {}
+        lookup = state.lookup_via_dir
+
+        for path in paths:
 
-            if not path.startswith(src):
+            if not isinstance(path, basestring):
+                yield self._call_fspath(state, path, False)
                 continue
 
-            if len(src) == len(path):
-                return dst
+            if empty:
+                yield path
+                continue
+
+            mapped = lookup(path, dirs)
+            yield path if mapped is None else mapped
+
+    def apply_many(self, paths):
+        """Apply the dirmap to every path in the given iterable.
 
-            if path[len(src)] == os.path.sep:
-                rel_path = path[len(src):]
-                return dst + rel_path
+        :return: A list of mapped paths, in the same order as the input.
 
-        return path
+        .. seealso:: :meth:`DirMap.iter_apply` for how the work is shared.
+
+        """
+        return list(self.iter_apply(paths))
+
+    def apply_array(self, arr):
+        """Apply the dirmap to every path in a NumPy array (or pandas Series).
+
+        This is vectorized, and so much faster than :meth:`DirMap.apply_many`
+        for large arrays; see :mod:`dirmap.vector` for how.
+
+        :param arr: An array of ``str`` or ``unicode`` dtype, or of objects
+            (in which anything other than a string is left as-is).
+        :return: A new array (or Series) of the same shape.
+        :raises ImportError: if NumPy is not installed.
+
+        """
+        from .vector import apply_array
+        return apply_array(self, arr)
 
     def get(self, *args, **kwargs):
         """Stub to stop one from accidentally using this like a normal mapping.
@@ -170,28 +926,82 @@ class DirMap(collections.Mapping):
         """
         raise NotImplementedError("DirMap is not really a dict; use item access instead.")
 
-    def apply(self, path):
+    def apply(self, path, embedded=False):
         """Applies the dirmap to the given path.
 
         This is the same as calling the dirmap directly, and provided for when
         your code would be clearer to use a method.
 
+        :param bool embedded: Replace sources anywhere within the string,
+            e.g. in a command line, rather than treating it as a single path.
+            See :mod:`dirmap.embedded` for how paths are delimited.
+
         """
 
-        return self(path)
+        return self(path, embedded)
+
+    def reverse(self, path):
+        """Map the given path from the destinations back to the sources.
+
+        This undoes :meth:`DirMap.apply`, and follows any changes to the
+        rules. Where many sources share a destination (e.g. from
+        :meth:`DirMap.add_existing`), the shortest source (and then the first
+        in lexicographic order) wins.
+
+        """
+
+        raw = path if isinstance(path, basestring) else _fspath(path)
+        if not isinstance(raw, basestring):
+            raise ValueError("DirMap requires a string or path-like object.")
+
+        state = self._state
+        if state.empty:
+            return path
+
+        mapped = state.reverse_lookup(raw)
+        if mapped is None:
+            return path
+        return mapped if raw is path else type(path)(mapped)
+
+    def inverse(self):
+        """Get a new map from the destinations back to the sources.
 
-    def deep_apply(self, obj, **kwargs):
+        The result is a copy, which does not follow changes to this map; see
+        :meth:`DirMap.reverse` for which source wins when they share a
+        destination.
+
+        """
+        return type(self)(
+            dict(self._state.get_inverse()), self._engine, self._cache_size, self._dir_cache,
+            self._dst_flavor, self._flavor,
+        )
+
+    def deep_apply(self, obj, embedded=False, jobs=None, **kwargs):
         """Apply to everything in the given structure.
 
+        :param bool embedded: Replace sources anywhere within strings;
+            see :meth:`DirMap.apply`.
+        :param int jobs: Split large top-level lists and dicts across this many
+            processes; see :mod:`dirmap.parallel` for caveats.
+
         .. seealso:: :func:`dirmap.deep.deep_apply` for caveats.
 
         """
 
+        # Everything is done with the rules from when we started.
+        state = self._state
+
         # Shortcut!
-        if not self._map:
+        if not state.map:
             return obj
+
+        if jobs:
+            from .parallel import deep_apply
+            return deep_apply(self, obj, jobs, embedded=embedded, **kwargs)
         
-        return _deep_apply((lambda x: self(x) if isinstance(x, basestring) else x), obj, **kwargs)
+        from .deep import deep_apply as _deep_apply
+        call = self._call
+        return _deep_apply((lambda x: call(state, x, embedded) if isinstance(x, basestring) else x), obj, **kwargs)
 
 
 
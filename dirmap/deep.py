@@ -1,54 +1,192 @@
+from itertools import izip
 
 
-def deep_apply(func, obj, dict_keys=False):
+def deep_apply(func, obj, dict_keys=False, inplace=False):
     """Apply func to everything in the given structure.
 
     This works predictably with dicts, lists, sets and tuples. Any classes
     which extend them are assumed to be able to be called with empty
-    constructors (except the tuple which will be passed a generator).
+    constructors (except the tuple which will be passed an iterable).
+
+    Containers in which nothing changed are returned as-is rather than
+    copied, so the result may share structure with the input. (Unless
+    modifying in place, containers which reference themselves are always
+    copied.)
+
+    If ``inplace``, then lists, dicts and sets are modified rather than
+    copied, and so only tuples in which something changed are rebuilt.
+
+    The structure is walked without recursion, so may be arbitrarily deep.
 
     """
 
     # We abuse this dict as both settings and the memo cache.
-    memo = {'dict_keys': bool(dict_keys)}
+    memo = {'dict_keys': bool(dict_keys), 'inplace': bool(inplace)}
 
     return _deep_apply(func, obj, memo)
 
 
+# Indices into the stack frames.
+_OBJ, _CHILDREN, _RESULTS, _PLACEHOLDER, _KEYS = range(5)
+
+_pending = object()
+
+_containers = (list, set, dict, tuple)
+
+
 def _deep_apply(func, obj, memo):
 
-    # In general, the memo cache exists for recursive objects.
-    # We construct an empty version, add it to the memo cache (keyed by the id
-    # of the original object), and then go about adding sub-objects to it.
-    try:
-        return memo[id(obj)]
-    except KeyError:
-        pass
+    dict_keys = memo['dict_keys']
+    inplace = memo.get('inplace')
 
-    if isinstance(obj, list):
+    # Frames of the mutable containers we are currently within, by id.
+    active = {}
+
+    stack = []
+
+    def resolve(x):
+
+        # The memo cache exists for shared and recursive objects.
+        value = memo.get(id(x), _pending)
+        if value is not _pending:
+            return value
+
+        # A reference back to a container we are still within, so we can't
+        # know if it will change. We construct an empty version to stand in
+        # for it, which forces it to be rebuilt (into this one) when done.
+        frame = active.get(id(x))
+        if frame is not None:
+            # Unless it is being modified, in which case it is its own result.
+            if inplace:
+                return x
+            if frame[_PLACEHOLDER] is None:
+                frame[_PLACEHOLDER] = type(x)()
+            return frame[_PLACEHOLDER]
+
+        if isinstance(x, (list, tuple)):
+            frame = [x, x, [], None, None]
+        elif isinstance(x, set):
+            frame = [x, list(x), [], None, None]
+        elif isinstance(x, dict):
+            keys = list(x)
+            values = [x[k] for k in keys]
+            if dict_keys:
+                # The keys are mapped too; see _finish.
+                frame = [x, keys + values, [], None, None]
+            else:
+                frame = [x, values, [], None, keys]
+        else:
+            return func(x)
+
+        # Tuples can't be stood in for, so they will be walked again if they
+        # are reached recursively (which must be via a mutable container).
+        if not isinstance(x, tuple):
+            active[id(x)] = frame
+        stack.append(frame)
+        return _pending
+
+    value = resolve(obj)
+
+    while stack:
+
+        frame = stack[-1]
+        results = frame[_RESULTS]
+        if value is not _pending:
+            results.append(value)
+
+        # Most children are leaves, which we can do without the overhead
+        # of going around the outer loop.
+        children = frame[_CHILDREN]
+        i = len(results)
+        count = len(children)
+        while i < count:
+            child = children[i]
+            if isinstance(child, _containers):
+                break
+            results.append(func(child))
+            i += 1
+
+        if i < count:
+            value = resolve(child)
+            continue
+
+        stack.pop()
+        value = _finish_inplace(frame) if inplace else _finish(frame)
+        obj = frame[_OBJ]
+        memo[id(obj)] = value
+        active.pop(id(obj), None)
+
+    return value
+
+
+def _finish(frame):
+
+    obj, children, results, new, keys = frame
+
+    if new is None:
+        for old, x in izip(children, results):
+            if old is not x:
+                break
+        else:
+            return obj
+
+    if isinstance(obj, tuple):
+        return type(obj)(results)
+
+    if new is None:
         new = type(obj)()
-        memo[id(obj)] = new
-        for x in obj:
-            new.append(_deep_apply(func, x, memo))
-        return new
+
+    if isinstance(obj, list):
+        new.extend(results)
 
     elif isinstance(obj, set):
-        new = type(obj)()
-        memo[id(obj)] = new
-        for x in obj:
-            new.add(_deep_apply(func, x, memo))
-        return new
+        new.update(results)
 
-    elif isinstance(obj, dict):
-        new = type(obj)()
-        memo[id(obj)] = new
-        dict_keys = memo['dict_keys']
-        for k, v in obj.iteritems():
-            new[_deep_apply(func, k, memo) if dict_keys else k] = _deep_apply(func, v, memo)
-        return new
+    elif keys is None:
+        count = len(results) // 2
+        for k, v in izip(results[:count], results[count:]):
+            new[k] = v
+
+    else:
+        for k, v in izip(keys, results):
+            new[k] = v
 
-    elif isinstance(obj, tuple):
-        return type(obj)(_deep_apply(func, x, memo) for x in obj)
+    return new
+
+
+def _finish_inplace(frame):
+
+    obj, children, results, _, keys = frame
+
+    if isinstance(obj, tuple):
+        return _finish(frame)
+
+    if isinstance(obj, list):
+        for i, (old, x) in enumerate(izip(children, results)):
+            if old is not x:
+                obj[i] = x
+
+    elif isinstance(obj, set):
+        changed = [(old, x) for old, x in izip(children, results) if old is not x]
+        # Remove everything before adding, in case new members are old ones.
+        for old, _ in changed:
+            obj.discard(old)
+        for _, x in changed:
+            obj.add(x)
+
+    elif keys is None:
+        count = len(results) // 2
+        keys, new_keys, values = children[:count], results[:count], results[count:]
+        for k, new_k in izip(keys, new_keys):
+            if k is not new_k:
+                del obj[k]
+        for k, new_k, old_v, v in izip(keys, new_keys, children[count:], values):
+            if k is not new_k or old_v is not v:
+                obj[new_k] = v
 
     else:
-        return func(obj)
+        for k, old, x in izip(keys, children, results):
+            if old is not x:
+                obj[k] = x
+
+    return obj
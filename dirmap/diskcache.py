@@ -0,0 +1,113 @@
+"""Caching compiled maps on disk, for processes which all build the same one.
+
+Building a map from a spec (in :meth:`DirMap.add_str` syntax) validates
+every rule, checks the filesystem for :meth:`DirMap.add_existing` groups,
+and compiles an index. :func:`load` instead reads the compiled
+:class:`~dirmap.frozen.FrozenDirMap` from a local cache directory with
+:mod:`marshal`, doing none of that work.
+
+Entries are keyed by a hash of the spec, the engine, and which paths of the
+spec's ``add_existing`` groups exist (checked via :mod:`dirmap.probe`), so a
+change of mounts picks a different entry. Entries are never removed.
+
+e.g.::
+
+    map_ = diskcache.load(os.environ['DIRMAP'])
+
+"""
+
+import hashlib
+import marshal
+import os
+import sys
+import tempfile
+
+from . import probe
+from .core import DirMap
+from .frozen import FrozenDirMap
+
+
+#: Bump whenever the format of the cached data changes.
+format_version = 1
+
+
+def get_cache_dir():
+    """Get the default cache directory.
+
+    This is ``$DIRMAP_CACHE_DIR``, or ``dirmap`` within ``$XDG_CACHE_HOME``
+    (which defaults to ``~/.cache``).
+
+    """
+    path = os.environ.get('DIRMAP_CACHE_DIR')
+    if path:
+        return path
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'dirmap')
+
+
+def _existing_groups(spec):
+    """Get every path of the ``add_existing`` groups within the spec."""
+    paths = []
+    for chunk in spec.split(';'):
+        parts = chunk.split(',')
+        if len(parts) > 1:
+            paths.extend(parts)
+    return paths
+
+
+def get_key(spec, engine='auto'):
+    """Get the cache key of a spec, given the current state of the filesystem."""
+
+    paths = _existing_groups(spec)
+    exists = probe.exists_many(paths) if paths else {}
+
+    # Marshal's format depends upon the version of Python.
+    key = repr((
+        format_version,
+        sys.version_info[:2],
+        engine,
+        spec,
+        [exists[p] for p in paths],
+    ))
+    return hashlib.sha1(key).hexdigest()
+
+
+def load(spec, engine='auto', cache_dir=None):
+    """Get a frozen map of the spec, from the cache if possible.
+
+    :param str spec: Rules in :meth:`DirMap.add_str` syntax.
+    :param engine: Engine name; see :mod:`dirmap.engines`.
+    :param str cache_dir: Where to keep entries; see :func:`get_cache_dir`.
+    :return: A :class:`~dirmap.frozen.FrozenDirMap`.
+
+    Entries which can't be read are rebuilt, and failures to write them are
+    ignored, so this still works if the cache directory is not writable.
+
+    """
+
+    cache_dir = cache_dir or get_cache_dir()
+    path = os.path.join(cache_dir, get_key(spec, engine) + '.marshal')
+
+    try:
+        with open(path, 'rb') as fh:
+            return FrozenDirMap.load(marshal.load(fh))
+    except (IOError, OSError, EOFError, ValueError, TypeError, KeyError):
+        pass
+
+    frozen = DirMap(spec, engine=engine).freeze()
+
+    try:
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix='.dirmap.')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                marshal.dump(frozen.dump(), fh)
+            os.rename(tmp_path, path)
+        except:
+            os.unlink(tmp_path)
+            raise
+    except (IOError, OSError):
+        pass
+
+    return frozen
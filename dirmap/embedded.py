@@ -0,0 +1,153 @@
+"""Finding and replacing sources embedded within larger strings.
+
+An embedded source is only replaced if it is a whole path (or the start of
+one), i.e. it must not be preceded by a character which could be part of a
+path, and must be followed by a separator or a character which could not be.
+
+"""
+
+import os
+
+
+#: Characters (other than alphanumerics) which may continue a path segment.
+segment_chars = '_.-'
+
+
+def is_segment_char(c):
+    return c.isalnum() or c in segment_chars
+
+
+class Automaton(object):
+
+    """An Aho-Corasick automaton which replaces many sources in one pass.
+
+    Each state is a dict of transitions; states which complete a source know
+    its length and destination, and every state links to the next state
+    along its failure chain which completes a (shorter) source.
+
+    """
+
+    def __init__(self, rules, sep=os.path.sep):
+
+        self.sep = sep
+
+        goto = self._goto = [{}]
+        dsts = self._dsts = [None]
+        lengths = self._lengths = [0]
+
+        for src, dst in rules.iteritems():
+            state = 0
+            for c in src:
+                next_ = goto[state].get(c)
+                if next_ is None:
+                    next_ = goto[state][c] = len(goto)
+                    goto.append({})
+                    dsts.append(None)
+                    lengths.append(0)
+                state = next_
+            dsts[state] = dst
+            lengths[state] = len(src)
+
+        # Breadth-first, so that the failure of every state is done before
+        # any which depend upon it.
+        fail = self._fail = [0] * len(goto)
+        link = self._link = [0] * len(goto)
+        queue = list(goto[0].itervalues())
+        for state in queue:
+            for c, next_ in goto[state].iteritems():
+                f = fail[state]
+                while f and c not in goto[f]:
+                    f = fail[f]
+                f = goto[f].get(c, 0)
+                fail[next_] = f
+                link[next_] = f if dsts[f] is not None else link[f]
+                queue.append(next_)
+
+    def iter_matches(self, text):
+        """Yield ``(start, end, dst)`` for every source found in the text.
+
+        This includes overlapping sources, but only those which respect the
+        path boundaries.
+
+        """
+
+        goto = self._goto
+        fail = self._fail
+        link = self._link
+        dsts = self._dsts
+        lengths = self._lengths
+        sep = self.sep
+        size = len(text)
+
+        state = 0
+        for i, c in enumerate(text):
+
+            while state and c not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(c, 0)
+
+            found = state if dsts[state] is not None else link[state]
+            if not found:
+                continue
+
+            end = i + 1
+            # Roots (e.g. "Z:\\") end with a separator, so are their own boundary.
+            if end < size and c != sep:
+                after = text[end]
+                if after != sep and is_segment_char(after):
+                    continue
+
+            while found:
+                start = end - lengths[found]
+                before = text[start - 1] if start else None
+                if before is None or not (before == sep or is_segment_char(before)):
+                    yield start, end, dsts[found]
+                found = link[found]
+
+    def replace(self, text, key=None, join=None):
+        """Replace every source within the text with its destination.
+
+        Where sources overlap, the one starting first (and then the longest)
+        is used.
+
+        :param key: A version of the text (of the same length) to search,
+            e.g. casefolded to match case-insensitively.
+        :param join: Called with the destination, the source (as found in
+            the key) and the rest of the path after it (up to the first
+            character which could not be part of it), and returning the
+            replacement of the whole path; e.g. to convert its separators.
+            The separator which ends a root is passed as the start of the
+            rest, rather than as part of the source.
+
+        """
+
+        key = text if key is None else key
+
+        # Every source has a separator, so most strings can be skipped.
+        if self.sep not in key:
+            return text
+
+        matches = sorted(self.iter_matches(key), key=lambda (start, end, dst): (start, -end))
+        if not matches:
+            return text
+
+        sep = self.sep
+        size = len(key)
+        parts = []
+        pos = 0
+        for start, end, dst in matches:
+            if start < pos:
+                continue
+            parts.append(text[pos:start])
+            if join is None:
+                parts.append(dst)
+                pos = end
+                continue
+            if key[end - 1] == sep:
+                end -= 1
+            pos = end
+            while pos < size and (key[pos] == sep or is_segment_char(key[pos])):
+                pos += 1
+            parts.append(join(dst, key[start:end], text[end:pos]))
+        parts.append(text[pos:])
+        return text[:0].join(parts)
@@ -0,0 +1,747 @@
+"""Structures for finding which rule applies to a given path.
+
+Every engine is built from a ``{src: dst}`` dict and provides ``match(path)``,
+which returns a ``(dst, end)`` tuple for the longest source which is a prefix
+of the path (ending on a separator boundary), or ``None``. The mapped path is
+then ``dst + path[end:]``.
+
+The rules of an engine never change. When those of a
+:class:`~dirmap.core.DirMap` do, it asks the engine for a changed copy via
+:meth:`~Engine.changed`, which shares what it can with the original; engines
+which can't do that are rebuilt from scratch. Those which can copy only what
+a change touches (using a :class:`~dirmap.persistent.PersistentDict` for
+anything large), so a change costs time proportional to the depth of the
+sources rather than the number of rules.
+
+Engines can :meth:`~Engine.dump` their compiled state as plain Python data,
+from which they can be loaded without recompiling; this is also how they
+are pickled.
+
+"""
+
+import os
+import re
+
+from .persistent import PersistentDict, leaf_max
+
+
+# Only the compact engine uses these, so they are imported once one is
+# built (or loaded), rather than whenever dirmap is.
+array = bisect_left = None
+
+def _import_compact():
+    global array, bisect_left
+    if array is None:
+        from array import array
+        from bisect import bisect_left
+
+
+def load_engine(name, data):
+    """Rebuild an engine from the output of :func:`dump_engine`."""
+    return engines[name].load(data)
+
+
+def dump_engine(engine):
+    """Get the ``(name, data)`` of an engine; data only holds builtin types."""
+    return engine.name, engine.dump()
+
+
+class Engine(object):
+
+    """Base class for engines."""
+
+    __slots__ = ()
+
+    #: The key of this engine in :data:`engines`.
+    name = None
+
+    def dump(self):
+        """Get the compiled state of this engine as builtin types."""
+        raise NotImplementedError()
+
+    def changed(self, added, removed):
+        """Get a copy of this engine with some rules changed, or None.
+
+        :param dict added: ``{src: dst}`` of rules to add (or replace).
+        :param removed: Sources of rules to remove, which happens first.
+        :return: The new engine, or None if this engine can't be changed
+            (in which case it must be rebuilt).
+
+        """
+        return None
+
+    def iter_rules(self):
+        """Yield every ``(src, dst)`` rule of this engine, in no particular order.
+
+        This is for engines which are built from another, so that they need
+        not keep their rules twice; not every engine implements it.
+
+        """
+        raise NotImplementedError()
+
+    @classmethod
+    def load(cls, data):
+        """Build an engine from the output of :meth:`dump`."""
+        self = cls.__new__(cls)
+        self._load(data)
+        return self
+
+    def __reduce__(self):
+        return load_engine, dump_engine(self)
+
+
+class LinearEngine(Engine):
+
+    """Scans every rule, longest source first, for one which is a prefix.
+
+    This is the cheapest to build, and fastest for small numbers of rules.
+
+    """
+
+    name = 'linear'
+
+    def __init__(self, rules, sep=os.path.sep):
+        self.sep = sep
+        self._sorted = sorted(rules.iteritems(), key=lambda (src, dst): (-len(src), src, dst))
+
+    def dump(self):
+        return self.sep, self._sorted
+
+    def _load(self, data):
+        self.sep, self._sorted = data
+
+    def match(self, path):
+        sep = self.sep
+        for src, dst in self._sorted:
+            if not path.startswith(src):
+                continue
+            end = len(src)
+            if end == len(path) or path[end] == sep:
+                return dst, end
+
+
+def create_trie(srcs, sep=os.path.sep):
+    """Build a trie of nested dicts keyed by path segments.
+
+    Nodes which terminate a source have a ``None`` key.
+
+    """
+    trie = {}
+    for src in srcs:
+        node = trie
+        for part in src.split(sep):
+            node = node.setdefault(part, {})
+        node[None] = True
+    return trie
+
+
+def format_trie_pattern(node, sep=os.path.sep):
+    """Format a trie as a regex of nested alternations.
+
+    Deeper branches are optional and greedy, so the regex will match the
+    longest source it can (backtracking if a later boundary check fails).
+    Returns ``None`` for a node with no children.
+
+    """
+
+    sep_re = re.escape(sep)
+
+    alts = []
+    for part, child in sorted(node.iteritems()):
+        if part is None:
+            continue
+        pattern = re.escape(part)
+        sub = format_trie_pattern(child, sep)
+        if sub is not None:
+            pattern += '(?:{}{}){}'.format(sep_re, sub, '?' if None in child else '')
+        alts.append(pattern)
+
+    if len(alts) > 1:
+        return '(?:{})'.format('|'.join(alts))
+    return alts[0] if alts else None
+
+
+class RegexEngine(Engine):
+
+    """Matches all rules at once with a single anchored regex.
+
+    The sources are arranged into a trie, and formatted into one pattern
+    so that a single ``match`` finds the longest source; the end of the match
+    is both the key to look up the destination and the start of the remainder.
+
+    This costs more to build than :class:`LinearEngine`, but the lookup does
+    not grow linearly with the number of rules.
+
+    """
+
+    name = 'regex'
+
+    def __init__(self, rules, sep=os.path.sep):
+        self.sep = sep
+        self._rules = dict(rules)
+        if self._rules:
+            pattern = format_trie_pattern(create_trie(self._rules, sep), sep)
+            self._compile(r'{}(?={}|\Z)'.format(pattern, re.escape(sep)))
+        else:
+            self._compile(None)
+
+    def _compile(self, pattern):
+        self._pattern = pattern
+        self._match = re.compile(pattern).match if pattern else lambda path: None
+
+    def dump(self):
+        return self.sep, self._rules, self._pattern
+
+    def _load(self, data):
+        self.sep, self._rules, pattern = data
+        self._compile(pattern)
+
+    def match(self, path):
+        m = self._match(path)
+        if m is not None:
+            end = m.end()
+            return self._rules[path[:end]], end
+
+
+class EntryRegexEngine(Engine):
+
+    """Scans a regex per rule, longest source first.
+
+    This is the production version of the ``deferredre`` and ``immediatere``
+    cores; it is generally slower than :class:`LinearEngine`.
+
+    """
+
+    name = 'entry_re'
+
+    def __init__(self, rules, sep=os.path.sep):
+        self._load((sep, sorted(rules.iteritems(), key=lambda (src, dst): (-len(src), src, dst))))
+
+    def dump(self):
+        return self.sep, self._sorted
+
+    def _load(self, data):
+        self.sep, self._sorted = data
+        sep_re = re.escape(self.sep)
+        self._entries = [
+            (re.compile(r'{}(?={}|\Z)'.format(re.escape(src), sep_re)).match, dst)
+            for src, dst in self._sorted
+        ]
+
+    def match(self, path):
+        for match, dst in self._entries:
+            m = match(path)
+            if m is not None:
+                return dst, m.end()
+
+
+class TrieEngine(Engine):
+
+    """Walks a trie of nested dicts, one level per path segment.
+
+    The lookup cost depends upon the depth of the path rather than the number
+    of rules, so this suits very large rule sets.
+
+    """
+
+    name = 'trie'
+
+    def __init__(self, rules, sep=os.path.sep):
+        self.sep = sep
+        self._trie = trie = {}
+        for src, dst in rules.iteritems():
+            node = trie
+            for part in src.split(sep):
+                node = node.setdefault(part, {})
+            node[None] = dst
+
+    def dump(self):
+        return self.sep, _plain_trie(self._trie)
+
+    def _load(self, data):
+        self.sep, self._trie = data
+
+    def iter_rules(self):
+        sep = self.sep
+        stack = [((), self._trie)]
+        while stack:
+            parts, node = stack.pop()
+            for part, child in node.iteritems():
+                if part is None:
+                    yield sep.join(parts), child
+                else:
+                    stack.append((parts + (part, ), child))
+
+    def changed(self, added, removed):
+
+        # Only the nodes along the changed sources are copied; the rest are
+        # shared with this engine. Nodes with too many children to copy
+        # cheaply are moved into a PersistentDict, which only copies a part.
+        sep = self.sep
+        copied = set()
+
+        def copy(node):
+            if isinstance(node, PersistentDict):
+                node = node.copy()
+            elif len(node) > leaf_max:
+                node = PersistentDict(node)
+            else:
+                node = dict(node)
+            copied.add(id(node))
+            return node
+
+        trie = copy(self._trie)
+
+        for src in removed:
+            parents = []
+            node = trie
+            for part in src.split(sep):
+                child = node.get(part)
+                if child is None:
+                    break
+                if id(child) not in copied:
+                    child = node[part] = copy(child)
+                parents.append((node, part))
+                node = child
+            else:
+                node.pop(None, None)
+                # Prune the branch if nothing else is under it.
+                while not node and parents:
+                    node, part = parents.pop()
+                    del node[part]
+
+        for src, dst in added.iteritems():
+            node = trie
+            for part in src.split(sep):
+                child = node.get(part)
+                if child is None:
+                    child = node[part] = copy({})
+                elif id(child) not in copied:
+                    child = node[part] = copy(child)
+                node = child
+            node[None] = dst
+
+        new = type(self).__new__(type(self))
+        new._load((sep, trie))
+        return new
+
+    def match(self, path):
+
+        # Nodes may be dicts or PersistentDicts; only get() is used.
+        node = self._trie
+        found = None
+        end = -1
+
+        for part in path.split(self.sep):
+            node = node.get(part)
+            if node is None:
+                break
+            end += len(part) + 1
+            dst = node.get(None)
+            if dst is not None:
+                found = dst, end
+
+        return found
+
+
+def _plain_trie(node):
+    """Get the trie with any PersistentDict nodes as dicts, copying only their parents."""
+    plain = node if type(node) is dict else dict(node.iteritems())
+    for part, child in node.iteritems():
+        if part is not None:
+            child_plain = _plain_trie(child)
+            if child_plain is not child:
+                if plain is node:
+                    plain = dict(node)
+                plain[part] = child_plain
+    return plain
+
+
+class DictEngine(Engine):
+
+    """Looks up each parent of the path in a dict, deepest first.
+
+    Building this is nearly free, and the lookup cost depends upon the depth
+    of the path rather than the number of rules.
+
+    """
+
+    name = 'dict'
+
+    def __init__(self, rules, sep=os.path.sep):
+        self.sep = sep
+        self._rules = dict(rules)
+
+    def dump(self):
+        rules = self._rules
+        return self.sep, rules if type(rules) is dict else dict(rules.iteritems())
+
+    def _load(self, data):
+        self.sep, self._rules = data
+
+    def changed(self, added, removed):
+        # The first change moves the rules into a PersistentDict.
+        rules = self._rules
+        rules = rules.copy() if isinstance(rules, PersistentDict) else PersistentDict(rules)
+        for src in removed:
+            rules.pop(src, None)
+        rules.update(added)
+        new = type(self).__new__(type(self))
+        new._load((self.sep, rules))
+        return new
+
+    def match(self, path):
+
+        rules = self._rules
+        dst = rules.get(path)
+        if dst is not None:
+            return dst, len(path)
+
+        rfind = path.rfind
+        sep = self.sep
+        end = rfind(sep)
+        while end >= 0:
+            dst = rules.get(path[:end])
+            if dst is not None:
+                return dst, end
+            end = rfind(sep, 0, end)
+
+
+class CompactEngine(Engine):
+
+    """Walks a trie stored in flat arrays, for very large rule sets.
+
+    Every distinct path segment is stored once, in a sorted list, and referred
+    to by its index in it. The sources form a trie whose nodes are numbered
+    level by level, so that the children of each node are contiguous and
+    sorted by segment; each node is then only a few integers in :mod:`array`
+    columns, rather than a dict. Destinations are the strings of the rules
+    themselves, so are shared with the :class:`~dirmap.core.DirMap`.
+
+    This takes a fraction of the memory of :class:`TrieEngine`, at the cost
+    of binary searches rather than hash lookups.
+
+    The arrays can't be changed, so changed copies share them, and hold the
+    changes in an overlay: a :class:`TrieEngine` of the rules added since,
+    and the sources removed (or replaced) since, whose matches are skipped.
+
+    """
+
+    # The :mod:`array` attributes, which are dumped as bytes.
+    _columns = ('_first', '_segment', '_dst')
+
+    __slots__ = ('sep', '_segments', '_dsts', '_added', '_removed') + _columns
+
+    name = 'compact'
+
+    #: The :mod:`array` typecode of every column.
+    typecode = 'i'
+
+    def __init__(self, rules, sep=os.path.sep):
+
+        _import_compact()
+        self.sep = sep
+        self._added = self._removed = None
+
+        segments = set()
+        for src in rules:
+            segments.update(src.split(sep))
+        self._segments = segments = sorted(segments)
+        ids = dict((seg, i) for i, seg in enumerate(segments)).__getitem__
+
+        # The sources. Sorting puts every distinct prefix in one run, so new
+        # nodes are found by comparing each source to the previous one. They
+        # are collected per level, in the order of their parents, and then
+        # numbered level by level after the root. Sorting with the separators
+        # as NULs (which paths cannot hold) is sorting by segments.
+        levels = []
+        path = []
+        previous = ()
+        self._dsts = dsts = []
+        for src in sorted(rules, key=lambda src: src.replace(sep, '\0')):
+            dsts.append(rules[src])
+            src = src.split(sep)
+            common = 0
+            limit = min(len(src), len(previous))
+            while common < limit and src[common] == previous[common]:
+                common += 1
+            del path[common:]
+            for depth in xrange(common, len(src)):
+                if depth == len(levels):
+                    levels.append(tuple(array(self.typecode) for _ in range(3)))
+                parents, level_segment, level_dst = levels[depth]
+                parents.append(path[-1] if path else 0)
+                level_segment.append(ids(src[depth]))
+                level_dst.append(-1)
+                path.append(len(level_segment) - 1)
+            level_dst[path[-1]] = len(dsts) - 1
+            previous = src
+        del ids
+
+        # The children of node ``n`` are ``first[n]`` up to ``first[n + 1]``.
+        first = self._first = array(self.typecode, [1])
+        segment = self._segment = array(self.typecode, [-1])
+        dst = self._dst = array(self.typecode, [-1])
+        start = 1
+        for depth, (parents, level_segment, level_dst) in enumerate(levels):
+            segment.extend(level_segment)
+            dst.extend(level_dst)
+            start += len(level_segment)
+            children = levels[depth + 1][0] if depth + 1 < len(levels) else ()
+            first.extend(start + bisect_left(children, i) for i in xrange(len(level_segment)))
+        first.append(start)
+
+    def dump(self):
+        if self._added is not None:
+            # The overlay is merged into new arrays.
+            return type(self)(dict(self.iter_rules()), self.sep).dump()
+        return (self.sep, self._segments, self._dsts) + tuple(
+            getattr(self, name).tostring() for name in self._columns
+        )
+
+    def _load(self, data):
+        _import_compact()
+        self.sep, self._segments, self._dsts = data[:3]
+        self._added = self._removed = None
+        for name, raw in zip(self._columns, data[3:]):
+            column = array(self.typecode)
+            column.fromstring(raw)
+            setattr(self, name, column)
+
+    def iter_rules(self):
+
+        added = self._added
+        removed = self._removed
+        if added is not None:
+            for rule in added.iter_rules():
+                yield rule
+
+        sep = self.sep
+        segments = self._segments
+        first = self._first
+        segment = self._segment
+        dst = self._dst
+        dsts = self._dsts
+
+        stack = [(0, None)]
+        while stack:
+            node, prefix = stack.pop()
+            for child in xrange(first[node], first[node + 1]):
+                part = segments[segment[child]]
+                src = part if prefix is None else prefix + sep + part
+                if dst[child] >= 0 and (removed is None or src not in removed):
+                    yield src, dsts[dst[child]]
+                stack.append((child, src))
+
+    def changed(self, added, removed):
+
+        new = type(self).__new__(type(self))
+        for name in self.__slots__:
+            setattr(new, name, getattr(self, name))
+
+        # Added sources are hidden in the arrays too, as they may replace
+        # one there.
+        gone = PersistentDict() if self._removed is None else self._removed.copy()
+        for src in removed:
+            gone[src] = True
+        for src in added:
+            gone[src] = True
+        new._removed = gone
+
+        if self._added is None:
+            new._added = TrieEngine(added, self.sep)
+        else:
+            new._added = self._added.changed(added, removed)
+        return new
+
+    def match(self, path):
+
+        removed = self._removed
+        segments = self._segments
+        count = len(segments)
+        first = self._first
+        segment = self._segment
+        dst = self._dst
+
+        node = 0
+        found = None
+        end = -1
+
+        for part in path.split(self.sep):
+            seg = bisect_left(segments, part)
+            if seg == count or segments[seg] != part:
+                break
+            hi = first[node + 1]
+            node = bisect_left(segment, seg, first[node], hi)
+            if node == hi or segment[node] != seg:
+                break
+            end += len(part) + 1
+            if dst[node] >= 0 and (removed is None or path[:end] not in removed):
+                found = node, end
+
+        if found is not None:
+            node, end = found
+            found = self._dsts[dst[node]], end
+
+        added = self._added
+        if added is not None:
+            # The longer wins; both never match the same source.
+            match = added.match(path)
+            if match is not None and (found is None or match[1] > found[1]):
+                return match
+
+        return found
+
+
+class AutoEngine(Engine):
+
+    """Picks an engine based on the rules and how they are being used.
+
+    Small rule sets get the :class:`LinearEngine`, and huge ones the
+    :class:`CompactEngine`. Others start with the cheap to build
+    :class:`TrieEngine`, which is kept if the rule set is large, or once the
+    rules change (since the trie is cheap to change). Changes keep the trie
+    or compact engine, however many rules they leave, unless few enough to
+    scan. Once enough lookups have been made to pay for compiling a
+    :class:`RegexEngine`, and the paths are deep enough to make splitting
+    them the dominant cost of the trie, one is compiled in a background
+    thread (so that no lookup waits for it), and used once it is ready.
+
+    """
+
+    #: Rule sets up to this size are scanned linearly.
+    linear_max = 8
+
+    #: Rule sets over this size are never compiled into a regex.
+    regex_max = 5000
+
+    #: Rule sets of at least this size are stored compactly.
+    compact_min = 1000000
+
+    #: Lookups per rule required before compiling a regex.
+    regex_lookups_per_rule = 16
+
+    #: Average path depth (in separators) required before compiling a regex.
+    regex_min_depth = 4
+
+    @classmethod
+    def select(cls, rules):
+        """Pick the engine class to use for rules without watching lookups.
+
+        This is for rules which will be used many times, so a regex is
+        compiled wherever one may be.
+
+        """
+        if len(rules) <= cls.linear_max:
+            return LinearEngine
+        if len(rules) >= cls.compact_min:
+            return CompactEngine
+        if len(rules) <= cls.regex_max:
+            return RegexEngine
+        return TrieEngine
+
+    @property
+    def name(self):
+        # We dump (and so pickle) as whichever engine we are currently using.
+        return self.engine.name
+
+    def dump(self):
+        return self.engine.dump()
+
+    def changed(self, added, removed):
+
+        # Rules which are changing keep (a changed copy of) their trie or
+        # compact engine, rather than being rebuilt as they cross a size.
+        engine = self._trie
+        if engine is None and isinstance(self.engine, CompactEngine):
+            engine = self.engine
+        if engine is None:
+            return None
+        count = self._size_after(added, removed)
+        if count <= self.linear_max:
+            return None
+
+        new = type(self).__new__(type(self))
+        new.sep = self.sep
+        new._size = count
+        new._use(engine.changed(added, removed))
+        new._trie = new.engine if self._trie is not None else None
+        return new
+
+    def _size_after(self, added, removed):
+        """The number of rules there will be after the given changes."""
+
+        def exists(src):
+            match = self.engine.match(src)
+            return match is not None and match[1] == len(src)
+
+        removed = set(removed)
+        count = self._size - sum(1 for src in removed if exists(src))
+        return count + sum(1 for src in added if src in removed or not exists(src))
+
+    def __init__(self, rules, sep=os.path.sep):
+
+        # The rules aren't kept; the trie (which we keep while it may be
+        # changed) can give them back for the regex.
+        self.sep = sep
+        self._size = len(rules)
+        self._trie = None
+
+        if len(rules) <= self.linear_max:
+            self._use(LinearEngine(rules, sep))
+            return
+        if len(rules) >= self.compact_min:
+            self._use(CompactEngine(rules, sep))
+            return
+
+        self._use(TrieEngine(rules, sep))
+        self._trie = self.engine
+        if len(rules) <= self.regex_max:
+            self._lookups = 0
+            self._depth = 0
+            self._budget = len(rules) * self.regex_lookups_per_rule
+            self.match = self._counting_match
+
+    def _use(self, engine):
+        self.engine = engine
+        self.match = engine.match
+
+    def _compile(self):
+        self._use(RegexEngine(dict(self._trie.iter_rules()), self.sep))
+
+    def _counting_match(self, path):
+
+        # These aren't thread safe, but they don't need to be accurate.
+        self._lookups += 1
+        self._depth += path.count(self.sep)
+
+        if self._lookups >= self._budget:
+            self.match = self.engine.match
+            if self._depth >= self._lookups * self.regex_min_depth:
+                import threading
+                self._compiling = threading.Thread(target=self._compile)
+                self._compiling.daemon = True
+                self._compiling.start()
+
+        return self.engine.match(path)
+
+
+engines = {
+    'linear': LinearEngine,
+    'regex': RegexEngine,
+    'entry_re': EntryRegexEngine,
+    'trie': TrieEngine,
+    'dict': DictEngine,
+    'compact': CompactEngine,
+    'auto': AutoEngine,
+}
+
+
+def get_engine(engine):
+    """Resolve an engine name (or class) to an engine class."""
+    if isinstance(engine, basestring):
+        try:
+            return engines[engine]
+        except KeyError:
+            raise ValueError("Unknown engine.", engine)
+    return engine
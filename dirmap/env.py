@@ -0,0 +1,55 @@
+"""The default map, configured by the environment.
+
+The ``DIRMAP`` environment variable holds rules in :meth:`DirMap.add_str`
+syntax, e.g.::
+
+    export DIRMAP="/Volumes/CGroot:/mnt/cgroot;/Volumes/Assets:/mnt/assets"
+
+It is not read until the map is first asked for, and the index is not
+compiled until the first lookup, so tools which might remap paths pay
+nothing unless they do.
+
+"""
+
+import os
+import thread
+
+from .core import DirMap
+
+
+#: The environment variable to read the rules from.
+env_var = 'DIRMAP'
+
+_lock = thread.allocate_lock()
+_default = None
+
+
+def default():
+    """Get the map configured by the ``DIRMAP`` environment variable.
+
+    It is built on the first call; later changes to the environment are
+    ignored until :func:`reset`.
+
+    """
+    global _default
+    map_ = _default
+    if map_ is None:
+        with _lock:
+            map_ = _default
+            if map_ is None:
+                map_ = _default = DirMap(os.environ.get(env_var) or None)
+    return map_
+
+
+def reset():
+    """Forget the default map, so the next use re-reads the environment."""
+    global _default
+    _default = None
+
+
+def apply(path, embedded=False):
+    """Apply the default map to the given path; see :meth:`DirMap.apply`."""
+    map_ = _default
+    if map_ is None:
+        map_ = default()
+    return map_(path, embedded)
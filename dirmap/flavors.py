@@ -0,0 +1,96 @@
+"""Path flavors: how paths are separated, compared and validated.
+
+A :class:`~dirmap.core.DirMap` has a flavor for its sources and another for
+its destinations, so that e.g. Windows paths may be mapped to Linux ones::
+
+    >>> dirmap = DirMap({'Z:\\\\Projects': '/mnt/projects'}, flavor='nt', dst_flavor='posix')
+    >>> dirmap('z:\\\\projects\\\\Foo\\\\bar.ma')
+    '/mnt/projects/Foo/bar.ma'
+
+Case-insensitive flavors match against an index of casefolded sources,
+so only the path being looked up is folded per call. The casing of the
+destination, and of the rest of the path, are kept.
+
+The available flavors are:
+
+- ``"posix"``: case-sensitive, ``/`` separated paths.
+- ``"posix-ci"``: case-insensitive, ``/`` separated paths (e.g. macOS).
+- ``"nt"``: case-insensitive Windows paths, with drive letters or UNC
+  shares, in which ``/`` is also a separator.
+
+"""
+
+import ntpath
+import os
+import posixpath
+
+
+class Flavor(object):
+
+    """A style of path.
+
+    :param str name: The key of this flavor in :data:`flavors`.
+    :param module: The :mod:`posixpath` or :mod:`ntpath` module.
+    :param bool casefold: Paths differing only by case are the same.
+
+    """
+
+    def __init__(self, name, module, casefold=False):
+        self.name = name
+        self.module = module
+        self.sep = module.sep
+        self.altsep = module.altsep
+        self.casefold = casefold
+        self.isabs = module.isabs
+        self.normpath = module.normpath
+
+        if module is ntpath:
+            # The root of a UNC share is absolute too.
+            self.isabs = lambda path: ntpath.isabs(path) or ntpath.splitdrive(path)[0][:2] in ('\\\\', '//')
+
+        #: If paths must be folded to match them; see :meth:`fold`.
+        self.folds = bool(casefold or self.altsep)
+
+    def __repr__(self):
+        return '<Flavor {}>'.format(self.name)
+
+    def fold(self, path):
+        """Get the form of the path in which it is compared to others.
+
+        The result is the same length as the path, so that indexes into one
+        are indexes into the other.
+
+        """
+        if self.altsep:
+            path = path.replace(self.altsep, self.sep)
+        return path.lower() if self.casefold else path
+
+    def to_sep(self, path, sep):
+        """Replace the separators in the path with the given one."""
+        if self.altsep and self.altsep != sep:
+            path = path.replace(self.altsep, sep)
+        if self.sep != sep:
+            path = path.replace(self.sep, sep)
+        return path
+
+
+flavors = {
+    'posix': Flavor('posix', posixpath),
+    'posix-ci': Flavor('posix-ci', posixpath, casefold=True),
+    'nt': Flavor('nt', ntpath, casefold=True),
+}
+
+#: The flavor of this platform.
+native = flavors['nt' if os.path is ntpath else 'posix']
+
+
+def get_flavor(flavor=None):
+    """Resolve a flavor name (or flavor, or None for the native one) to a flavor."""
+    if flavor is None:
+        return native
+    if isinstance(flavor, basestring):
+        try:
+            return flavors[flavor]
+        except KeyError:
+            raise ValueError("Unknown flavor.", flavor)
+    return flavor
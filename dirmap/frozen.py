@@ -0,0 +1,228 @@
+"""Immutable, pre-compiled snapshots of a DirMap; see :meth:`DirMap.freeze`."""
+
+import collections
+import os
+
+from .core import _convert, _convert_rules, _fspath, _join, _root
+from .deep import deep_apply as _deep_apply
+from .embedded import Automaton
+from .engines import AutoEngine, dump_engine, get_engine, load_engine
+from .flavors import native
+
+
+def _join_native(dst, src, rest):
+    return _join(dst, src, rest, native, native)
+
+
+def _load(cls, data):
+    return cls.load(data)
+
+
+class FrozenDirMap(object):
+
+    """An immutable :class:`~dirmap.core.DirMap`, with everything compiled up front.
+
+    The index for byte strings is built when frozen, so calling this with one
+    is a single engine match; there are no caches, and nothing to check for
+    changes. Indexes for unicode strings and embedded paths are built (and
+    kept) on first use, since most maps never need them.
+
+    As it never changes, it may be shared between threads without locking,
+    and is hashable. It pickles as its compiled index, so is cheap to send to
+    other processes.
+
+    """
+
+    __slots__ = ('_map', '_index', '_match', '_others', '_hash')
+
+    def __init__(self, rules=None, index=None, engine=None):
+        set_ = object.__setattr__
+        rules = dict(rules or ())
+        if index is None:
+            engine = get_engine(engine) if engine else AutoEngine.select(rules)
+            index = engine(_convert_rules(rules, str, native, native), os.path.sep)
+        set_(self, '_map', rules)
+        set_(self, '_index', index)
+        set_(self, '_match', index.match)
+        set_(self, '_others', {})
+        set_(self, '_hash', None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("FrozenDirMap is immutable.")
+
+    __delattr__ = __setattr__
+
+    def dump(self):
+        """Get the rules and compiled index, as builtin types (e.g. for :mod:`marshal`)."""
+        return self._map, dump_engine(self._index)
+
+    @classmethod
+    def load(cls, data):
+        """Rebuild from the output of :meth:`dump`, without recompiling."""
+        rules, index = data
+        return cls(rules, load_engine(*index))
+
+    def __reduce__(self):
+        return _load, (type(self), self.dump())
+
+    def freeze(self):
+        return self
+
+    def __iter__(self):
+        return iter(self._map)
+
+    def __getitem__(self, src):
+        return self._map[src]
+
+    def __len__(self):
+        return len(self._map)
+
+    def __contains__(self, src):
+        return src in self._map
+
+    def keys(self):
+        return self._map.keys()
+
+    def items(self):
+        return self._map.items()
+
+    def values(self):
+        return self._map.values()
+
+    def iteritems(self):
+        return self._map.iteritems()
+
+    def get(self, *args, **kwargs):
+        """Stub to stop one from accidentally using this like a normal mapping."""
+        raise NotImplementedError("FrozenDirMap is not really a dict; use item access instead.")
+
+    def __hash__(self):
+        if self._hash is None:
+            object.__setattr__(self, '_hash', hash(frozenset(self._map.iteritems())))
+        return self._hash
+
+    def __eq__(self, other):
+        if isinstance(other, FrozenDirMap):
+            return self._map == other._map
+        return NotImplemented
+
+    def __ne__(self, other):
+        if isinstance(other, FrozenDirMap):
+            return self._map != other._map
+        return NotImplemented
+
+    def __repr__(self):
+        return 'FrozenDirMap({!r})'.format(self._map)
+
+    def __call__(self, path, embedded=False):
+
+        if type(path) is str and not embedded:
+            match = self._match(path)
+            if match is None:
+                return path
+            dst, end = match
+            rest = path[end:]
+            if len(rest) > 1:
+                return dst + rest
+            return _join_native(dst, path[:end], rest) if path else path
+
+        return self._call_slow(path, embedded)
+
+    def _call_slow(self, path, embedded):
+
+        if not isinstance(path, basestring):
+            raw = _fspath(path)
+            if not isinstance(raw, basestring):
+                raise ValueError("DirMap requires a string or path-like object.")
+            mapped = self(raw, embedded)
+            return path if mapped is raw else type(path)(mapped)
+
+        # Racing threads may both build these, but the results are the same.
+        type_ = type(path)
+        key = type_, embedded
+        other = self._others.get(key)
+        if other is None:
+            sep = _convert(os.path.sep, type_)
+            if embedded:
+                rules = _convert_rules(self._map, type_, native, native, form='automaton')
+                other = Automaton(rules, sep).replace
+            else:
+                other = type(self._index)(_convert_rules(self._map, type_, native, native), sep).match
+            self._others[key] = other
+
+        if embedded:
+            return other(path, None, _join_native)
+
+        match = other(path)
+        if match is None:
+            return path
+        dst, end = match
+        return _join_native(dst, path[:end], path[end:]) if path else path
+
+    def apply(self, path, embedded=False):
+        """Same as :meth:`DirMap.apply`."""
+        return self(path, embedded)
+
+    def iter_apply(self, paths):
+        """Same as :meth:`DirMap.iter_apply`."""
+
+        # The rules may be unicode, and only equal byte paths once encoded.
+        exact = self._others.get(str)
+        if exact is None:
+            exact = self._others[str] = _convert_rules(self._map, str, native, native, form='exact')
+        sep = os.path.sep
+        dirs = {}
+
+        for path in paths:
+
+            if type(path) is not str:
+                yield self(path)
+                continue
+
+            dst = exact.get(path)
+            if dst is not None:
+                yield dst
+                continue
+
+            head, found, tail = path.rpartition(sep)
+            if not found:
+                yield path
+                continue
+            try:
+                mapped = dirs[head]
+            except KeyError:
+                if head[-1:] == sep:
+                    # e.g. the root of "//a", which maps differently when whole.
+                    yield self(path)
+                    continue
+                # Matched directly, as the head of e.g. "/a" is empty.
+                match = self._match(head)
+                if match is not None:
+                    mapped = _join_native(match[0], head[:match[1]], head[match[1]:])
+                    # Roots (e.g. "/") are joined to the rest without their separator.
+                    if _root(mapped[:-1], native) == mapped:
+                        mapped = mapped[:-1]
+                    mapped = intern(mapped)
+                else:
+                    mapped = None
+                dirs[head] = mapped
+            yield path if mapped is None else mapped + sep + tail
+
+    def apply_many(self, paths):
+        """Same as :meth:`DirMap.apply_many`."""
+        return list(self.iter_apply(paths))
+
+    def deep_apply(self, obj, embedded=False, jobs=None, **kwargs):
+        """Same as :meth:`DirMap.deep_apply`."""
+
+        if not self._map:
+            return obj
+
+        if jobs:
+            from .parallel import deep_apply
+            return deep_apply(self, obj, jobs, embedded=embedded, **kwargs)
+
+        return _deep_apply((lambda x: self(x, embedded) if isinstance(x, basestring) else x), obj, **kwargs)
+
+
+collections.Mapping.register(FrozenDirMap)
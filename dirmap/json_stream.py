@@ -0,0 +1,98 @@
+"""Applying a DirMap to JSON documents too large to load.
+
+The document is read in chunks, and only its strings are parsed; everything
+else (including strings which are not changed) is copied to the output as
+it was, so the output is byte-for-byte the same as the input other than the
+remapped strings. Memory use is constant, other than that each string must
+fit in memory.
+
+The input is assumed to be valid UTF-8 JSON; it is not validated.
+
+e.g.::
+
+    dirmap json -r /src:/dst --keys job.json > remapped.json
+
+"""
+
+import json
+import re
+
+
+#: How much to read from the input at once.
+chunk_size = 1 << 20
+
+_string_re = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"', re.S)
+_space_re = re.compile(r'[ \t\n\r]*')
+
+
+def _map_token(map_, token, embedded):
+    """Map a JSON string token, returning the original if it doesn't change."""
+
+    if '\\' in token:
+        value = json.loads(token)
+    else:
+        value = token[1:-1]
+
+    new = map_(value, embedded)
+    if new is value or new == value:
+        return token
+
+    out = json.dumps(new, ensure_ascii=False)
+    if isinstance(out, unicode):
+        out = out.encode('utf8')
+    return out
+
+
+def remap(map_, in_fh, out_fh, dict_keys=False, embedded=False):
+    """Map every string value in the JSON read from ``in_fh``, writing to ``out_fh``.
+
+    :param map_: The :class:`~dirmap.core.DirMap` to apply.
+    :param bool dict_keys: Map object keys as well as values.
+    :param bool embedded: Map paths within strings; see :meth:`DirMap.apply`.
+
+    """
+
+    read = in_fh.read
+    write = out_fh.write
+    size = chunk_size
+
+    buf = read(size)
+    eof = not buf
+    pos = 0
+
+    while True:
+
+        start = buf.find('"', pos)
+        if start < 0:
+            write(buf[pos:])
+            if eof:
+                return
+            buf = read(size)
+            eof = not buf
+            pos = 0
+            continue
+
+        write(buf[pos:start])
+
+        # We need the whole string, and the next significant character
+        # after it to tell if it is a key.
+        while True:
+            m = _string_re.match(buf, start)
+            if m is not None:
+                end = m.end()
+                after = _space_re.match(buf, end).end()
+                if after < len(buf) or eof:
+                    break
+            elif eof:
+                raise ValueError("Unterminated string in JSON.", buf[start:start + 100])
+            more = read(size)
+            eof = not more
+            buf = buf[start:] + more
+            start = 0
+
+        token = buf[start:end]
+        if dict_keys or after == len(buf) or buf[after] != ':':
+            token = _map_token(map_, token, embedded)
+        write(token)
+
+        pos = end
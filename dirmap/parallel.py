@@ -0,0 +1,119 @@
+"""Applying a DirMap to very large structures across many processes.
+
+Only the top level of the structure is split up: the items of a list (or
+tuple), or the values (and keys) of a dict, are sent in chunks to a pool of
+worker processes, each of which has a frozen copy of the map; see
+:meth:`DirMap.freeze`. Maps which can't be frozen (those of other than the
+native flavor) are sent as they pickle: their rules and settings.
+
+Since each chunk is pickled separately, references between chunks (or back
+up to the top level) are not preserved; each chunk gets its own copies. Use
+the serial :meth:`DirMap.deep_apply` for such structures.
+
+"""
+
+import multiprocessing
+
+#: Top-level collections smaller than this are done in this process.
+threshold = 10000
+
+#: How many chunks to split the work into per process.
+chunks_per_job = 4
+
+
+_worker_state = None
+
+def snapshot(map_):
+    """Get the map to send to worker processes; frozen, if it may be."""
+    try:
+        return map_.freeze()
+    except ValueError:
+        return map_
+
+
+def _init_worker(map_, kwargs):
+    global _worker_state
+    _worker_state = map_, kwargs
+
+def _apply_chunk(chunk):
+    """Apply to a list, returning ``None`` if nothing changed."""
+    map_, kwargs = _worker_state
+    result = map_.deep_apply(chunk, **kwargs)
+    if result is not chunk:
+        return result
+
+
+def _chunks(items, jobs):
+    size = max(1, -(-len(items) // (jobs * chunks_per_job)))
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def deep_apply(map_, obj, jobs, embedded=False, dict_keys=False, inplace=False):
+    """Parallel version of :meth:`DirMap.deep_apply`.
+
+    :param int jobs: The number of worker processes.
+
+    Results are the same as the serial version, except for references
+    between chunks; see :mod:`dirmap.parallel`.
+
+    """
+
+    serial_kwargs = dict(embedded=embedded, dict_keys=dict_keys, inplace=inplace)
+    if (
+        not map_ or not jobs or jobs < 2 or
+        not isinstance(obj, (list, tuple, dict)) or
+        len(obj) < threshold
+    ):
+        return map_.deep_apply(obj, **serial_kwargs)
+
+    if isinstance(obj, dict):
+        keys = list(obj)
+        items = [obj[k] for k in keys]
+        if dict_keys:
+            items = keys + items
+    else:
+        items = list(obj) if isinstance(obj, tuple) else obj
+
+    pool = multiprocessing.Pool(jobs, _init_worker, (snapshot(map_), dict(serial_kwargs, inplace=False)))
+    try:
+        # Everything comes back in order, with None for unchanged chunks.
+        chunks = list(_chunks(items, jobs))
+        results = []
+        changed = False
+        for chunk, result in zip(chunks, pool.imap(_apply_chunk, chunks)):
+            if result is None:
+                results.extend(chunk)
+            else:
+                results.extend(result)
+                changed = True
+        pool.close()
+    finally:
+        pool.terminate()
+
+    if not changed:
+        return obj
+
+    if isinstance(obj, tuple):
+        return type(obj)(results)
+
+    if isinstance(obj, list):
+        if inplace:
+            obj[:] = results
+            return obj
+        new = type(obj)()
+        new.extend(results)
+        return new
+
+    if dict_keys:
+        count = len(keys)
+        keys, results = results[:count], results[count:]
+
+    if inplace:
+        obj.clear()
+        new = obj
+    else:
+        new = type(obj)()
+    for k, v in zip(keys, results):
+        new[k] = v
+    return new
@@ -0,0 +1,253 @@
+"""A dict whose copies share their contents, so are cheap to make and change.
+
+Each version of the rules of a :class:`~dirmap.core.DirMap` is a copy of
+the last with a few changes (see :class:`~dirmap.core._State`), as are the
+nodes of the tries of changed engines; copying a whole dict for each would
+make every change cost as much as the number of rules.
+
+A :class:`PersistentDict` spreads its items over a tree of small dicts by
+their hashes: each branch is a list of :data:`fanout` children, picked by
+the next few bits of the hash, and the leaves are plain dicts. Copies share
+the whole tree, and the first change to a copy along any branch copies that
+branch (and its leaf) for itself, so a change costs time proportional to the
+depth of the tree, which grows with the logarithm of the size.
+
+"""
+
+import itertools
+
+
+#: Bits of the hash used to pick the child of each branch.
+bits = 5
+
+#: Children of every branch.
+fanout = 1 << bits
+
+#: Leaves holding more items than this are split into a branch. Larger
+#: leaves hold their items more densely, but cost more to copy.
+leaf_max = 1024
+
+# Hashes have 64 bits; leaves deeper than this are never split.
+_max_depth = 64 // bits
+_mask = fanout - 1
+
+
+class PersistentDict(object):
+
+    """A mutable mapping which is copied in constant time.
+
+    Copies (via :meth:`copy`) share everything until changed, and changing
+    one never changes the others. Reading costs a few list lookups more than
+    a dict. Like a dict, it must not be changed while being iterated over.
+
+    :param items: A dict (or other mapping, or iterable of pairs) to start
+        with.
+
+    """
+
+    __slots__ = ('_root', '_len', '_owned')
+
+    def __init__(self, items=None):
+        # Nodes which are only in this tree (by id), and so may be changed
+        # in place; the values keep them (and so their ids) alive.
+        self._owned = {}
+        if isinstance(items, dict):
+            self._root = self._build(items, 0)
+            self._len = len(items)
+        else:
+            self._root = self._own({})
+            self._len = 0
+            if items:
+                self.update(items)
+
+    def _own(self, node):
+        self._owned[id(node)] = node
+        return node
+
+    def _build(self, items, depth):
+
+        # The depth at which the leaves should fit, if the hashes are even.
+        levels = 0
+        count = len(items)
+        while count > leaf_max and depth + levels < _max_depth:
+            count >>= bits
+            levels += 1
+        if not levels:
+            return self._own(dict(items))
+
+        # Spread the items straight into the leaves, by all the bits of the
+        # hash which pick them, rather than a level at a time.
+        shift = depth * bits
+        mask = (1 << (levels * bits)) - 1
+        leaves = [{} for _ in xrange(1 << (levels * bits))]
+        for key, value in items.iteritems():
+            leaves[(hash(key) >> shift) & mask][key] = value
+
+        # Any which still don't fit are split further.
+        depth += levels
+        nodes = [self._build(leaf, depth) if len(leaf) > leaf_max else self._own(leaf) for leaf in leaves]
+
+        # The lowest bits pick the child of the top branch, so the siblings
+        # under each branch are spread evenly through the nodes below it.
+        while len(nodes) > 1:
+            span = len(nodes) >> bits
+            nodes = [self._own(nodes[i::span]) for i in xrange(span)]
+        return nodes[0]
+
+    def copy(self):
+        """Get a copy, in constant time."""
+        new = type(self).__new__(type(self))
+        new._root = self._root
+        new._len = self._len
+        new._owned = {}
+        # Neither may change the shared nodes in place any more.
+        self._owned = {}
+        return new
+
+
+    def _own_leaf(self, key):
+        """Get the leaf for the key (copying it if shared), its parent and its depth."""
+
+        owned = self._owned
+        node = self._root
+        if id(node) not in owned:
+            node = self._root = self._own(type(node)(node))
+
+        parent = None
+        depth = 0
+        hash_ = hash(key)
+        while type(node) is list:
+            parent = node
+            child = node[hash_ & _mask]
+            if id(child) not in owned:
+                child = node[hash_ & _mask] = self._own(type(child)(child))
+            node = child
+            hash_ >>= bits
+            depth += 1
+
+        return node, parent, depth
+
+    def _leaf(self, key):
+        """Get the leaf for the key, without copying anything."""
+        node = self._root
+        if type(node) is list:
+            hash_ = hash(key)
+            while type(node) is list:
+                node = node[hash_ & _mask]
+                hash_ >>= bits
+        return node
+
+    def get(self, key, default=None):
+        # The walk of _leaf is repeated here, as this is used by lookups.
+        node = self._root
+        if type(node) is list:
+            hash_ = hash(key)
+            while type(node) is list:
+                node = node[hash_ & _mask]
+                hash_ >>= bits
+        return node.get(key, default)
+
+    def __getitem__(self, key):
+        return self._leaf(key)[key]
+
+    def __contains__(self, key):
+        return key in self._leaf(key)
+
+    def __setitem__(self, key, value):
+
+        leaf, parent, depth = self._own_leaf(key)
+        size = len(leaf)
+        leaf[key] = value
+        if len(leaf) == size:
+            return
+        self._len += 1
+
+        if len(leaf) > leaf_max and depth < _max_depth:
+            del self._owned[id(leaf)]
+            branch = self._build(leaf, depth)
+            if parent is None:
+                self._root = branch
+            else:
+                parent[(hash(key) >> (bits * (depth - 1))) & _mask] = branch
+
+    def __delitem__(self, key):
+        # Emptied leaves are kept; only the rules which are removed shrink.
+        leaf = self._own_leaf(key)[0]
+        del leaf[key]
+        self._len -= 1
+
+    def pop(self, key, *default):
+        if key not in self._leaf(key):
+            if default:
+                return default[0]
+            raise KeyError(key)
+        leaf = self._own_leaf(key)[0]
+        self._len -= 1
+        return leaf.pop(key)
+
+    def setdefault(self, key, default=None):
+        leaf = self._leaf(key)
+        if key in leaf:
+            return leaf[key]
+        self[key] = default
+        return default
+
+    def update(self, items):
+        if hasattr(items, 'iteritems'):
+            items = items.iteritems()
+        for key, value in items:
+            self[key] = value
+
+    def __len__(self):
+        return self._len
+
+    def __nonzero__(self):
+        return self._len > 0
+
+    def _leaves(self):
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if type(node) is list:
+                stack.extend(node)
+            elif node:
+                yield node
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self._leaves())
+
+    iterkeys = __iter__
+
+    def iteritems(self):
+        return itertools.chain.from_iterable(leaf.iteritems() for leaf in self._leaves())
+
+    def itervalues(self):
+        return itertools.chain.from_iterable(leaf.itervalues() for leaf in self._leaves())
+
+    def keys(self):
+        return list(self)
+
+    def items(self):
+        return list(self.iteritems())
+
+    def values(self):
+        return list(self.itervalues())
+
+    def __eq__(self, other):
+        if isinstance(other, (dict, PersistentDict)):
+            return len(self) == len(other) and all(
+                key in other and other[key] == value for key, value in self.iteritems()
+            )
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'PersistentDict({!r})'.format(dict(self.iteritems()))
+
+    def __reduce__(self):
+        return type(self), (dict(self.iteritems()), )
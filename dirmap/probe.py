@@ -0,0 +1,97 @@
+"""Checking which of many paths exist, without waiting on hung mounts.
+
+Each path is checked in its own (daemon) thread, so a slow or hung network
+mount only delays the answer for paths on it, and only up to the
+:data:`default_timeout`; paths which take longer are considered not to exist.
+
+The answers are remembered for the whole process for :data:`ttl` seconds,
+so many maps built from the same spec stat each path once. A path which is
+still being checked by another thread is waited on rather than re-checked.
+
+"""
+
+import os
+import threading
+import time
+
+
+#: Seconds to wait for any one path to be checked.
+default_timeout = 5.0
+
+#: Seconds to remember whether a path exists (or timed out).
+ttl = 60.0
+
+
+_lock = threading.Lock()
+
+# Path -> (exists, expiry time).
+_cache = {}
+
+# Path -> Event set when the check in flight is done.
+_in_flight = {}
+
+
+def clear_cache():
+    """Forget everything previously checked."""
+    with _lock:
+        _cache.clear()
+
+
+def _check(path, event):
+    exists = os.path.exists(path)
+    with _lock:
+        _cache[path] = exists, time.time() + ttl
+        _in_flight.pop(path, None)
+    event.set()
+
+
+def exists_many(paths, timeout=None):
+    """Check if many paths exist, concurrently.
+
+    :param paths: Iterable of paths to check.
+    :param float timeout: Seconds to wait for every path; defaults to the
+        module's :data:`default_timeout`.
+    :return dict: ``{path: exists}``; paths which timed out are ``False``.
+
+    """
+
+    timeout = default_timeout if timeout is None else timeout
+    now = time.time()
+
+    results = {}
+    waiting = []
+
+    with _lock:
+        for path in paths:
+
+            if path in results:
+                continue
+
+            cached = _cache.get(path)
+            if cached is not None and cached[1] > now:
+                results[path] = cached[0]
+                continue
+
+            event = _in_flight.get(path)
+            if event is None:
+                event = _in_flight[path] = threading.Event()
+                thread = threading.Thread(target=_check, args=(path, event), name='dirmap.probe')
+                thread.daemon = True
+                thread.start()
+            waiting.append((path, event))
+
+    # The paths are all checked at once, so they share one deadline.
+    deadline = now + timeout
+    for path, event in waiting:
+        event.wait(max(0, deadline - time.time()))
+        with _lock:
+            cached = _cache.get(path)
+            if event.is_set() and cached is not None:
+                results[path] = cached[0]
+                continue
+            # Remember the timeout, so others don't wait on it too; the real
+            # answer replaces this when (if) it comes.
+            _cache[path] = False, time.time() + ttl
+        results[path] = False
+
+    return results
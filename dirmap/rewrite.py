@@ -0,0 +1,197 @@
+"""Rewrite paths embedded within files, such as Maya, Nuke or USD scenes.
+
+Files are memory-mapped and scanned with a single regex built from every
+source in the map, so they are never read into memory as a whole. The
+rewritten contents are streamed to a temporary file which then replaces the
+original (or is written elsewhere).
+
+Sources must respect the same boundaries as in :mod:`dirmap.embedded`, and
+are matched exactly, so only maps of the native flavor which does not fold
+paths (i.e. not on Windows) may be used.
+
+e.g.::
+
+    dirmap rewrite -r /Volumes/CGroot:/mnt/cgroot -j 8 --include '*.ma' scenes/
+
+"""
+
+import fnmatch
+import itertools
+import mmap
+import multiprocessing
+import os
+import re
+import tempfile
+
+from .core import DirMap
+from .embedded import segment_chars
+from .engines import create_trie, format_trie_pattern
+
+
+_segment_class = r'\w' + re.escape(segment_chars)
+
+#: How much of the file to copy at once between matches.
+chunk_size = 1 << 20
+
+
+def compile_pattern(srcs, sep=os.path.sep):
+    """Compile a regex which finds any of the given sources in a larger string.
+
+    The left boundary is not checked here (since a lookbehind at the start of
+    the pattern defeats the regex engine's optimizations); see
+    :func:`is_left_boundary`.
+
+    """
+    pattern = format_trie_pattern(create_trie(srcs, sep), sep)
+    if not pattern:
+        return re.compile(r'(?!)')
+    return re.compile(r'{}(?![{}])'.format(pattern, _segment_class))
+
+
+_not_left_boundary = re.compile(r'[{}{}]'.format(_segment_class, re.escape(os.path.sep))).match
+
+def is_left_boundary(buf, start):
+    """Can a path start at the given index of the buffer?"""
+    return not start or _not_left_boundary(buf[start - 1]) is None
+
+
+def iter_replacements(buf, rules, pattern):
+    """Yield ``(start, end, dst)`` for every source to replace in the buffer."""
+    search = pattern.search
+    pos = 0
+    while True:
+        m = search(buf, pos)
+        if m is None:
+            return
+        start = m.start()
+        if is_left_boundary(buf, start):
+            end = m.end()
+            yield start, end, rules[m.group()]
+            pos = end
+        else:
+            pos = start + 1
+
+
+def _as_dict(rules):
+    if isinstance(rules, DirMap):
+        rules._assert_exact('used to rewrite files')
+    return rules if isinstance(rules, dict) else dict(rules)
+
+
+def _copy(buf, start, end, write):
+    while start < end:
+        stop = min(end, start + chunk_size)
+        write(buf[start:stop])
+        start = stop
+
+
+def rewrite_file(rules, src_path, dst_path=None, pattern=None):
+    """Rewrite paths in one file.
+
+    :param rules: A :class:`~dirmap.core.DirMap`, or ``{src: dst}`` dict.
+    :param str src_path: The file to read.
+    :param str dst_path: Where to write the result; defaults to replacing
+        the original. Unchanged files are not written to if they would be
+        replacing themselves.
+    :param pattern: A pre-compiled :func:`compile_pattern` for the rules.
+    :return int: The number of replacements.
+    :raises ValueError: if a map is not of the native flavor, or it folds paths.
+
+    """
+
+    rules = _as_dict(rules)
+    pattern = pattern or compile_pattern(rules)
+    dst_path = dst_path or src_path
+
+    with open(src_path, 'rb') as in_fh:
+
+        size = os.fstat(in_fh.fileno()).st_size
+        buf = mmap.mmap(in_fh.fileno(), 0, access=mmap.ACCESS_READ) if size else ''
+        try:
+
+            replacements = iter_replacements(buf, rules, pattern)
+            first = next(replacements, None)
+            if first is None and dst_path == src_path:
+                return 0
+
+            dir_ = os.path.dirname(os.path.abspath(dst_path))
+            fd, tmp_path = tempfile.mkstemp(dir=dir_, prefix='.dirmap.')
+            try:
+                count = 0
+                with os.fdopen(fd, 'wb') as out_fh:
+                    write = out_fh.write
+                    pos = 0
+                    if first is not None:
+                        for start, end, dst in itertools.chain([first], replacements):
+                            _copy(buf, pos, start, write)
+                            write(dst)
+                            pos = end
+                            count += 1
+                    _copy(buf, pos, size, write)
+                os.chmod(tmp_path, os.stat(src_path).st_mode & 0o7777)
+                os.rename(tmp_path, dst_path)
+            except:
+                os.unlink(tmp_path)
+                raise
+
+        finally:
+            if size:
+                buf.close()
+
+    return count
+
+
+def iter_files(paths, include=None):
+    """Yield every file given, or within the directories given.
+
+    :param list include: Glob patterns, one of which the names of files found
+        within directories must match. Files given directly are always used.
+
+    """
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for dir_path, dir_names, file_names in os.walk(path):
+            dir_names.sort()
+            for name in sorted(file_names):
+                if not include or any(fnmatch.fnmatch(name, pat) for pat in include):
+                    yield os.path.join(dir_path, name)
+
+
+_worker_state = None
+
+def _init_worker(rules):
+    global _worker_state
+    _worker_state = rules, compile_pattern(rules)
+
+def _rewrite_in_worker(path):
+    rules, pattern = _worker_state
+    return path, rewrite_file(rules, path, pattern=pattern)
+
+
+def rewrite_paths(rules, paths, include=None, jobs=None):
+    """Rewrite every file in the given paths, in place.
+
+    :param int jobs: Rewrite in this many worker processes.
+    :return: Yields ``(path, count)`` for every file, in order.
+    :raises ValueError: if a map is not of the native flavor, or it folds paths.
+
+    """
+
+    rules = _as_dict(rules)
+    files = iter_files(paths, include)
+
+    if not jobs or jobs < 2:
+        pattern = compile_pattern(rules)
+        for path in files:
+            yield path, rewrite_file(rules, path, pattern=pattern)
+        return
+
+    pool = multiprocessing.Pool(jobs, _init_worker, (rules, ))
+    try:
+        for result in pool.imap(_rewrite_in_worker, files):
+            yield result
+        pool.close()
+    finally:
+        pool.terminate()
@@ -0,0 +1,193 @@
+"""Opt-in instrumentation of a DirMap: rule hits, misses and latencies.
+
+e.g.::
+
+    >>> stats = dirmap.instrument()
+    >>> dirmap('/src/a')
+    >>> stats.hits
+    Counter({'/src': 1})
+
+Instrumenting a map replaces some of its methods with wrappers, so maps
+which are not instrumented (or no longer are) pay nothing at all.
+Instrumented lookups cost about twice as much, since the rule which was
+used is found again for counting.
+
+The counters are not locked, so may miss a few updates when shared
+between threads.
+
+"""
+
+import collections
+import time
+
+from .core import _root
+
+
+class Histogram(object):
+
+    """Counts of durations, bucketed by powers of two of nanoseconds."""
+
+    def __init__(self):
+        #: ``{upper bound in ns: count}``
+        self.buckets = collections.Counter()
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds):
+        self.buckets[1 << int(seconds * 1e9).bit_length()] += 1
+        self.count += 1
+        self.total += seconds
+
+    def percentile(self, p):
+        """Get the upper bound (in ns) of the bucket holding the given percentile."""
+        target = self.count * p / 100.0
+        seen = 0
+        for bound in sorted(self.buckets):
+            seen += self.buckets[bound]
+            if seen >= target:
+                return bound
+
+
+class Stats(object):
+
+    """What an instrumented :class:`~dirmap.core.DirMap` has done.
+
+    :param int sample_every: Time one of every this many calls to the map.
+        Batch methods (:meth:`DirMap.apply_many` and
+        :meth:`DirMap.deep_apply`) are always timed.
+    :param callback: Called as ``callback(op, seconds)`` for every timing,
+        where ``op`` is one of ``"call"``, ``"apply_many"`` or
+        ``"deep_apply"``; e.g. to feed a metrics exporter.
+
+    """
+
+    def __init__(self, sample_every=100, callback=None):
+
+        self.sample_every = sample_every
+        self.callback = callback
+
+        #: ``{src: count}`` of lookups which each rule mapped.
+        self.hits = collections.Counter()
+
+        #: ``{first segment: count}`` of absolute paths which were not mapped
+        #: (after the drive, for ``nt`` paths).
+        self.misses = collections.Counter()
+
+        #: ``{op: Histogram}`` of sampled timings.
+        self.latency = collections.defaultdict(Histogram)
+
+        self._countdown = sample_every
+
+    def reset(self):
+        """Forget everything recorded so far."""
+        self.hits.clear()
+        self.misses.clear()
+        self.latency.clear()
+
+    def dead_rules(self, map_):
+        """Get the sources of the map which have not been hit."""
+        return sorted(src for src in map_ if not self.hits[src])
+
+    def record(self, op, seconds):
+        self.latency[op].add(seconds)
+        if self.callback is not None:
+            self.callback(op, seconds)
+
+    def count(self, state, path, mapped):
+        """Count the lookup of one path against the given map state."""
+
+        if not isinstance(path, basestring) or not state.map:
+            return
+
+        flavor = state.flavor
+        if not flavor.isabs(path):
+            return
+
+        # The result doesn't tell us which rule was used, so we find it again,
+        # as the index holds it (folded by the flavor, and roots without their
+        # separator).
+        key = path if state.fold is None else state.fold(path)
+        match = state.index(type(path)).match(key) if mapped is not path else None
+        if match is not None:
+            src = key[:match[1]]
+            if state.folded is not None:
+                src = state.folded.get(src, src)
+            else:
+                src = _root(src, flavor) or src
+            self.hits[src] += 1
+        else:
+            parts = path.replace(flavor.altsep, flavor.sep) if flavor.altsep else path
+            self.misses[parts.split(flavor.sep, 2)[1]] += 1
+
+
+def instrument(map_, stats=None):
+    """Start recording the work of the map; see :meth:`DirMap.instrument`."""
+
+    stats = stats or Stats()
+    timer = time.time
+    record = stats.record
+    count = stats.count
+
+    call = type(map_)._call.__get__(map_)
+    iter_apply = type(map_).iter_apply.__get__(map_)
+    apply_many = type(map_).apply_many.__get__(map_)
+    deep_apply = type(map_).deep_apply.__get__(map_)
+
+    def instrumented_call(state, path, embedded):
+
+        stats._countdown -= 1
+        if stats._countdown > 0:
+            mapped = call(state, path, embedded)
+        else:
+            stats._countdown = stats.sample_every
+            start = timer()
+            mapped = call(state, path, embedded)
+            record('call', timer() - start)
+
+        if not embedded:
+            count(state, path, mapped)
+        return mapped
+
+    def instrumented_iter_apply(paths):
+
+        state = map_._state
+        pending = collections.deque()
+
+        def remember(paths):
+            for path in paths:
+                pending.append(path)
+                yield path
+
+        for mapped in iter_apply(remember(paths)):
+            count(state, pending.popleft(), mapped)
+            yield mapped
+
+    def instrumented_apply_many(paths):
+        # The paths are counted via the instrumented iter_apply.
+        start = timer()
+        results = apply_many(paths)
+        record('apply_many', timer() - start)
+        return results
+
+    def instrumented_deep_apply(obj, *args, **kwargs):
+        # The strings within are counted via the instrumented call.
+        start = timer()
+        result = deep_apply(obj, *args, **kwargs)
+        record('deep_apply', timer() - start)
+        return result
+
+    map_._call = instrumented_call
+    map_.iter_apply = instrumented_iter_apply
+    map_.apply_many = instrumented_apply_many
+    map_.deep_apply = instrumented_deep_apply
+    map_._stats = stats
+    return stats
+
+
+def uninstrument(map_):
+    """Stop recording the work of the map, returning its :class:`Stats`."""
+    stats = map_._stats
+    for name in '_call', 'iter_apply', 'apply_many', 'deep_apply':
+        map_.__dict__.pop(name, None)
+    map_._stats = None
+    return stats
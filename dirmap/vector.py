@@ -0,0 +1,186 @@
+"""Applying a DirMap to whole NumPy arrays (or pandas Series) of paths at once.
+
+Rather than looking up each path in Python, the sources are grouped by
+length. For each length, every path is truncated to it (as a whole array)
+and searched for among the sorted sources with :func:`numpy.searchsorted`;
+matches must then be followed by a separator or the end of the path, and
+longer matches replace shorter ones. The mapped paths are then built per
+source length, also as whole arrays.
+
+The work done in Python is proportional to the number of distinct source
+lengths rather than the number of paths, so this suits very large arrays.
+
+NumPy is only required to use this module.
+
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .core import _convert, _root
+
+
+def _width(arr):
+    """The number of characters of the dtype of a string array."""
+    return arr.dtype.itemsize // (4 if arr.dtype.kind == 'U' else 1)
+
+
+def _chars(arr):
+    """View a 1-D string array as a 2-D array of its characters."""
+    kind = arr.dtype.kind
+    return np.ascontiguousarray(arr).view(kind + '1').reshape(len(arr), _width(arr))
+
+
+def _group_rules(rules, kind, flavor, dst_flavor):
+    """Get ``[(length, sorted srcs, dsts, roots, bare, wholes)]``, shortest first.
+
+    ``roots`` is which sources are roots (held without their separator),
+    ``bare`` which of those are not paths without it (e.g. ``"Z:"``), and
+    ``wholes`` are the destinations of paths which are the whole source.
+
+    """
+    by_length = {}
+    for src, dst in rules.iteritems():
+        by_length.setdefault(len(src), []).append((src, dst))
+    groups = []
+    for length, pairs in sorted(by_length.iteritems()):
+        pairs.sort()
+        srcs = np.array([src for src, _ in pairs], dtype='{}{}'.format(kind, max(length, 1)))
+        dsts = np.array([dst for _, dst in pairs])
+        roots = np.array([_root(src, flavor) is not None for src, _ in pairs])
+        bare = np.array([not flavor.isabs(src) for src, _ in pairs])
+        wholes = np.array([_root(dst, dst_flavor) or dst for _, dst in pairs])
+        groups.append((length, srcs, dsts, roots, bare, wholes))
+    return groups
+
+
+def _apply(state, arr):
+    """Map a 1-D array of ``S`` or ``U`` dtype, returning a new array."""
+
+    kind = arr.dtype.kind
+    type_ = str if kind == 'S' else unicode
+    flavor = state.flavor
+    sep = _convert(flavor.sep, type_)
+    empty = type_()
+
+    count = len(arr)
+    width = _width(arr)
+    if not count or not width:
+        return arr.copy()
+
+    # Fold the paths for matching; this keeps their lengths.
+    key = arr
+    if state.fold is not None:
+        if flavor.altsep:
+            key = np.char.replace(key, _convert(flavor.altsep, type_), sep)
+        if flavor.casefold:
+            key = np.char.lower(key)
+    key_chars = _chars(key)
+
+    groups = _group_rules(state.convert_rules(type_), kind, flavor, state.dst_flavor)
+
+    # Which group and source each path matched, longest last.
+    matched_group = np.full(count, -1, dtype=np.intp)
+    matched_index = np.zeros(count, dtype=np.intp)
+
+    for i, (length, srcs, dsts, roots, bare, wholes) in enumerate(groups):
+
+        if length > width:
+            break
+
+        if length:
+            prefixes = key.astype('{}{}'.format(kind, length))
+            pos = np.minimum(np.searchsorted(srcs, prefixes), len(srcs) - 1)
+            hit = srcs[pos] == prefixes
+        else:
+            # The root "/" is held as an empty source.
+            pos = np.zeros(count, dtype=np.intp)
+            hit = np.ones(count, dtype=bool)
+        if length < width:
+            after = key_chars[:, length]
+            # Bare roots (e.g. "Z:") must be followed by their separator.
+            hit &= (after == sep) | ((after == empty) & ~bare[pos])
+        else:
+            hit &= ~bare[pos]
+
+        matched_group[hit] = i
+        matched_index[hit] = pos[hit]
+
+    chars = _chars(arr)
+    results = []
+    out_width = width
+    for i, (length, srcs, dsts, roots, bare, wholes) in enumerate(groups):
+
+        rows = np.flatnonzero(matched_group == i)
+        if not len(rows):
+            continue
+
+        index = matched_index[rows]
+        if length < width:
+            tails = np.ascontiguousarray(chars[rows, length:]).view('{}{}'.format(kind, width - length)).ravel()
+            if state.to_dst is not None:
+                dst_sep = _convert(state.dst_flavor.sep, type_)
+                for c in flavor.sep, flavor.altsep:
+                    if c and c != dst_sep:
+                        tails = np.char.replace(tails, _convert(c, type_), dst_sep)
+            mapped = np.char.add(dsts[index], tails)
+            # As in dirmap.core._join, paths which are the whole source (or
+            # root) are the destination as it was given.
+            after = key_chars[rows, length]
+            whole = after == empty
+            if length + 1 < width:
+                whole |= roots[index] & (after == sep) & (key_chars[rows, length + 1] == empty)
+            else:
+                whole |= roots[index] & (after == sep)
+            mapped = np.where(whole, wholes[index], mapped)
+        else:
+            mapped = wholes[index]
+
+        results.append((rows, mapped))
+        out_width = max(out_width, _width(mapped))
+
+    out = arr.astype('{}{}'.format(kind, out_width))
+    for rows, mapped in results:
+        out[rows] = mapped
+    return out
+
+
+def apply_array(map_, arr):
+    """Apply the map to every path in an array; see :meth:`DirMap.apply_array`."""
+
+    if np is None:
+        raise ImportError("DirMap.apply_array requires NumPy.")
+
+    series = None
+    if hasattr(arr, 'index') and hasattr(arr, 'values'):
+        series = arr
+        arr = series.values
+
+    arr = np.asarray(arr)
+    state = map_._state
+    flat = arr.ravel()
+
+    if not state.map:
+        out = flat.copy()
+
+    elif arr.dtype.kind in 'SU':
+        out = _apply(state, flat)
+
+    elif arr.dtype.kind == 'O':
+        # Strings are mapped in bulk by type; everything else (e.g. the
+        # NaN of missing values in pandas) is left alone.
+        out = flat.copy()
+        for type_, kind in (str, 'S'), (unicode, 'U'):
+            mask = np.fromiter((type(x) is type_ for x in flat), dtype=bool, count=len(flat))
+            if mask.any():
+                out[mask] = _apply(state, flat[mask].astype(kind)).tolist()
+
+    else:
+        raise TypeError("DirMap.apply_array requires an array of strings.", arr.dtype)
+
+    out = out.reshape(arr.shape)
+    if series is not None:
+        return type(series)(out, index=series.index, name=series.name)
+    return out
@@ -7,8 +7,18 @@ setup(
     description='Directory remapper.',
     url='http://github.com/vfxetc/dirmap',
     
-    packages=find_packages(exclude=['build*', 'tests*']),
+    packages=find_packages(exclude=['benchmarks*', 'build*', 'tests*']),
     include_package_data=True,
+
+    extras_require={
+        'numpy': ['numpy'],
+    },
+
+    entry_points={
+        'console_scripts': [
+            'dirmap = dirmap.cli:main',
+        ],
+    },
     
     author='Mike Boers',
     author_email='floss+dirmap@vfxetc.com',
@@ -0,0 +1,58 @@
+from StringIO import StringIO
+from unittest import TestCase
+import os
+import subprocess
+import sys
+
+from dirmap import DirMap
+from dirmap import cli
+
+
+class TestCLI(TestCase):
+
+    def setUp(self):
+        self.map_ = DirMap({'/src': '/dst'})
+        self.paths = ['/src/{}'.format(i) if i % 2 else '/other/{}'.format(i) for i in range(1000)]
+        self.expected = [self.map_(p) for p in self.paths]
+
+    def remap(self, input_, delim='\n', jobs=None, chunk_size=None):
+        out = StringIO()
+        old_chunk_size = cli.chunk_size
+        cli.chunk_size = chunk_size or old_chunk_size
+        try:
+            cli.remap_stream(self.map_, StringIO(input_), out, delim, jobs)
+        finally:
+            cli.chunk_size = old_chunk_size
+        return out.getvalue()
+
+    def test_remap_stream(self):
+
+        input_ = '\n'.join(self.paths) + '\n'
+        output = '\n'.join(self.expected) + '\n'
+
+        self.assertEqual(self.remap(input_), output)
+        self.assertEqual(self.remap(input_, chunk_size=7), output)
+
+        # Unterminated final records stay unterminated.
+        self.assertEqual(self.remap(input_.rstrip('\n'), chunk_size=7), output.rstrip('\n'))
+
+        self.assertEqual(self.remap('\0'.join(self.paths), '\0'), '\0'.join(self.expected))
+        self.assertEqual(self.remap(''), '')
+
+    def test_remap_stream_jobs(self):
+        input_ = '\n'.join(self.paths) + '\n'
+        output = '\n'.join(self.expected) + '\n'
+        self.assertEqual(self.remap(input_, jobs=3, chunk_size=100), output)
+
+    def test_remap_stream_flavors(self):
+        self.map_ = DirMap({'Z:\\Src': '/dst'}, flavor='nt', dst_flavor='posix')
+        for jobs in None, 2:
+            self.assertEqual(self.remap('z:\\src\\a\nZ:/other\n', jobs=jobs), '/dst/a\nZ:/other\n')
+
+    def test_main(self):
+        root = os.path.abspath(os.path.join(__file__, '..', '..'))
+        proc = subprocess.Popen([sys.executable, '-m', 'dirmap', 'map', '-r', '/src:/dst'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, cwd=root)
+        out, _ = proc.communicate('/src/a\n/other/b\n')
+        self.assertEqual(proc.returncode, 0)
+        self.assertEqual(out, '/dst/a\n/other/b\n')
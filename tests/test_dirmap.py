@@ -2,6 +2,9 @@ from unittest import TestCase
 import os
 
 from dirmap import DirMap
+from dirmap import core
+from dirmap.engines import engines, AutoEngine, CompactEngine, DictEngine, LinearEngine, RegexEngine, TrieEngine
+from dirmap.persistent import PersistentDict
 
 
 class TestDirMap(TestCase):
@@ -79,3 +82,611 @@ class TestDirMap(TestCase):
         self.assertEqual(b[0], '/dst')
         self.assertIs(b[1], b)
 
+    def test_apply_many(self):
+
+        map_ = DirMap([
+            ('/src', '/dst'),
+            ('/src/inner', '/dst2/inner'),
+        ])
+
+        paths = [
+            '/src',
+            '/src/a',
+            '/src/inner',
+            '/src/inner/b',
+            '/src/innerx/c',
+            '/srcx/d',
+            '/path/to/thing',
+            'relative/src/e',
+            '/src/a',
+        ]
+        self.assertEqual(map_.apply_many(paths), [map_(p) for p in paths])
+        self.assertEqual(list(map_.iter_apply(iter(paths))), [map_(p) for p in paths])
+
+        self.assertEqual(DirMap().apply_many(paths), paths)
+        self.assertRaises(ValueError, map_.apply_many, ['/src', None])
+
+    def test_engines(self):
+
+        rules = [
+            ('/', '/root'),
+            ('/src', '/dst'),
+            ('/src/inner', '/dst2/inner'),
+            ('/src/inner/deeper', '/dst3'),
+            ('/src2', '/dst4'),
+            ('/src with spaces', '/dst with spaces'),
+            ('/a.b/c+d', '/e'),
+        ]
+        paths = [
+            '/',
+            '//double',
+            '/src',
+            '/src/',
+            '/src//a',
+            '/src/a',
+            '/src/inner',
+            '/src/inner/b',
+            '/src/innerx/c',
+            '/src/inner/deeper/d',
+            '/src/inner/deeperx',
+            '/src2/e',
+            '/src3/f',
+            '/src with spaces/g',
+            '/a.b/c+d/h',
+            '/aXb/c+d/i',
+            '/path/to/thing',
+        ]
+
+        expected = [DirMap(rules)(p) for p in paths]
+        for engine in engines:
+            map_ = DirMap(rules, engine=engine)
+            self.assertEqual([map_(p) for p in paths], expected, engine)
+            self.assertEqual(map_.apply_many(paths), expected, engine)
+
+        self.assertRaises(ValueError, DirMap, engine='notanengine')
+
+    def test_engines_root(self):
+        for name, cls in sorted(engines.iteritems()):
+            engine = cls({'/': '/x'})
+            self.assertEqual(engine.match('/'), ('/x', 1), name)
+            self.assertEqual(engine.match('/a'), None, name)
+            map_ = DirMap({'/': '/x', '/src': '/dst'}, engine=name)
+            paths = ['/', '/a', '//a', '/a/', '/src/a', '/srcx', 'a', '']
+            expected = ['/x', '/x/a', '/x//a', '/x/a/', '/dst/a', '/x/srcx', 'a', '']
+            self.assertEqual([map_(p) for p in paths], expected, name)
+            self.assertEqual(map_.apply_many(paths), expected, name)
+            self.assertEqual([map_.freeze()(p) for p in paths], expected, name)
+            self.assertEqual(map_.freeze().apply_many(paths), expected, name)
+            self.assertEqual(map_(' '.join(paths), embedded=True), ' '.join(expected), name)
+            self.assertEqual(map_.reverse('/x/a'), '/a')
+
+            map_ = DirMap({'/mnt': '/'}, engine=name)
+            paths = ['/mnt', '/mnt/', '/mnt/a', '/mntx']
+            expected = ['/', '/', '/a', '/mntx']
+            self.assertEqual(map_.apply_many(paths), expected, name)
+            self.assertEqual(map_.freeze().apply_many(paths), expected, name)
+            self.assertEqual(map_.reverse('/a'), '/mnt/a')
+        rules = dict(('/src/{}'.format(i), '/dst/{}'.format(i)) for i in range(20))
+        rules['/'] = '/x'
+        engine = AutoEngine(rules)
+        engine._compile()
+        self.assertIsInstance(engine.engine, RegexEngine)
+        self.assertEqual(engine.match('/'), ('/x', 1))
+        self.assertEqual(engine.match('/a'), None)
+        self.assertEqual(engine.match('/src/1/a'), ('/dst/1', 6))
+
+    def test_auto_engine(self):
+
+        small = AutoEngine({'/src': '/dst'})
+        self.assertIsInstance(small.engine, LinearEngine)
+
+        rules = dict(('/src/{}'.format(i), '/dst/{}'.format(i)) for i in range(20))
+        deep = '/src/1/a/b/c/d'
+        shallow = '/src/1'
+
+        engine = AutoEngine(rules)
+        self.assertIsInstance(engine.engine, TrieEngine)
+        for i in range(20 * AutoEngine.regex_lookups_per_rule):
+            self.assertEqual(engine.match(deep), ('/dst/1', 6))
+        # The regex is compiled in the background.
+        engine._compiling.join()
+        self.assertIsInstance(engine.engine, RegexEngine)
+        self.assertEqual(engine.match(deep), ('/dst/1', 6))
+
+        engine = AutoEngine(rules)
+        for i in range(20 * AutoEngine.regex_lookups_per_rule):
+            engine.match(shallow)
+        self.assertIsInstance(engine.engine, TrieEngine)
+
+        # Changes keep the trie while there are neither few nor many rules.
+        changed = engine.changed({'/src/1': '/elsewhere', '/src/new': '/new'}, ['/src/2'])
+        self.assertIsInstance(changed.engine, TrieEngine)
+        self.assertEqual(changed._size, 20)
+        self.assertEqual(changed.match('/src/new/a'), ('/new', 8))
+        self.assertIsNone(changed.changed({}, ['/src/{}'.format(i) for i in range(3, 20)]))
+
+        class HugeAutoEngine(AutoEngine):
+            compact_min = 10
+        self.assertIsInstance(HugeAutoEngine(rules).engine, CompactEngine)
+        self.assertIs(HugeAutoEngine.select(rules), CompactEngine)
+        huge = HugeAutoEngine(rules).changed({'/src/new': '/new'}, ['/src/1'])
+        self.assertIsInstance(huge.engine, CompactEngine)
+        self.assertEqual(huge.match('/src/new/a'), ('/new', 8))
+        self.assertIsNone(huge.match('/src/1/a'))
+
+    def test_compact_engine(self):
+
+        import marshal
+        import random
+
+        rand = random.Random(0)
+        rules = {'/': '/root', '/a b': 'relative', '/a/b': '/x/', '': '/empty'}
+        for i in range(500):
+            src = '/' + '/'.join(rand.choice('abc') + str(rand.randrange(4)) for _ in range(rand.randrange(1, 6)))
+            rules[src] = '/dst/{}/{}'.format(i % 7, rand.choice(('asset', 'a1', '')))
+        paths = ['/a/b', '/a/bc', '/a b/c', '/', '', 'relative', '/zzz']
+        paths.extend(src + rand.choice(('', '/', '/more', 'x', '/a1/b2')) for src in rules)
+
+        trie = TrieEngine(rules, '/')
+        compact = CompactEngine(rules, '/')
+        for path in paths:
+            self.assertEqual(compact.match(path), trie.match(path), path)
+
+        # Segments are shared between sources.
+        self.assertEqual(len(compact._segments), len(set(compact._segments)))
+        self.assertLess(len(compact._segments), 50)
+        self.assertNotIn('__dict__', dir(compact))
+
+        clone = CompactEngine.load(marshal.loads(marshal.dumps(compact.dump())))
+        self.assertEqual([clone.match(p) for p in paths], [compact.match(p) for p in paths])
+
+        # Changed copies share the arrays, and overlay the changes.
+        expected = dict(rules)
+        changed = compact
+        for added, removed in (
+            ({'/a0/new': '/n0', '/': '/root2'}, ['', '/a/b']),
+            ({'/a/b': '/back', '/a0/new/deeper': '/n1'}, ['/a0/new']),
+            ({}, sorted(rules)[::3]),
+        ):
+            changed = changed.changed(added, removed)
+            for src in removed:
+                expected.pop(src, None)
+            expected.update(added)
+            trie = TrieEngine(expected, '/')
+            for path in paths + ['/a0/new/deeper/x']:
+                self.assertEqual(changed.match(path), trie.match(path), path)
+        self.assertIs(changed._first, compact._first)
+        self.assertEqual(dict(changed.iter_rules()), expected)
+
+        clone = CompactEngine.load(marshal.loads(marshal.dumps(changed.dump())))
+        self.assertIsNone(clone._added)
+        self.assertEqual([clone.match(p) for p in paths], [changed.match(p) for p in paths])
+
+        compact = CompactEngine(dict((unicode(k), unicode(v)) for k, v in rules.items()), u'/')
+        self.assertEqual(compact.match(u'/a/b/c'), (u'/x/', 4))
+        self.assertIsNone(CompactEngine({}).match('/a'))
+
+    def test_cache(self):
+
+        map_ = DirMap({'/src': '/dst'}, cache_size=2)
+        self.assertIs(DirMap().cache_info(), None)
+
+        self.assertEqual(map_('/src/a'), '/dst/a')
+        self.assertEqual(map_('/src/a'), '/dst/a')
+        self.assertEqual(map_('/other'), '/other')
+        self.assertEqual(map_.cache_info(), (1, 2, 2, 2))
+
+        # Evicts /src/a, which is the least recently used.
+        self.assertEqual(map_.apply('/src/b'), '/dst/b')
+        self.assertEqual(map_('/other'), '/other')
+        self.assertEqual(map_('/src/a'), '/dst/a')
+        self.assertEqual(map_.cache_info(), (2, 4, 2, 2))
+
+        # Adding rules clears it.
+        map_.add_one('/src/a', '/dst2')
+        self.assertEqual(map_.cache_info().currsize, 0)
+        self.assertEqual(map_('/src/a'), '/dst2')
+
+    def test_dir_cache(self):
+
+        map_ = DirMap({'/src': '/dst', '/src/a/b': '/dst2'}, dir_cache=True)
+
+        self.assertEqual(map_('/src/a/1'), '/dst/a/1')
+        self.assertEqual(map_('/src/a/2'), '/dst/a/2')
+        self.assertEqual(map_('/src/a/b'), '/dst2')
+        self.assertEqual(map_('/src/a/b/3'), '/dst2/3')
+        self.assertEqual(map_('/other/4'), '/other/4')
+        self.assertEqual(map_.apply_many(['/src/a/5', '/other/6']), ['/dst/a/5', '/other/6'])
+        self.assertEqual(sorted(map_._state.dirs), ['/other', '/src/a', '/src/a/b'])
+
+        # Adding rules clears it.
+        map_.add_one('/src/a', '/dst3')
+        self.assertEqual(map_('/src/a/1'), '/dst3/1')
+
+    def test_embedded(self):
+
+        map_ = DirMap({
+            '/src': '/dst',
+            '/src/inner': '/dst2',
+            '/Volumes/CGroot': '/mnt/cgroot',
+            '/with spaces': '/without',
+        })
+
+        self.assertEqual(
+            map_('maya -file /Volumes/CGroot/a.ma -proj /Volumes/CGroot -x /src/inner/b', embedded=True),
+            'maya -file /mnt/cgroot/a.ma -proj /mnt/cgroot -x /dst2/b',
+        )
+        self.assertEqual(map_.apply('PATH=/src/bin:/src/inner:/usr/bin', embedded=True), 'PATH=/dst/bin:/dst2:/usr/bin')
+        self.assertEqual(map_('"/with spaces/a",\'/src\'', embedded=True), '"/without/a",\'/dst\'')
+
+        # Boundaries.
+        for text in ('/srcx', '/src.bak', '/other/src', 'x/src', '/src-2', 'no paths', ''):
+            self.assertEqual(map_(text, embedded=True), text)
+
+        # Whole paths still work.
+        self.assertEqual(map_('/src/a', embedded=True), '/dst/a')
+        self.assertEqual(map_('/src/inner', embedded=True), '/dst2')
+
+        x = map_.deep_apply({'cmd': ['render', '-o', '--out=/src/out'], 'env': {'ROOT': '/src'}}, embedded=True)
+        self.assertEqual(x, {'cmd': ['render', '-o', '--out=/dst/out'], 'env': {'ROOT': '/dst'}})
+
+        # Adding rules rebuilds it.
+        map_.add_one('/src/other', '/dst3')
+        self.assertEqual(map_('a /src/other/b', embedded=True), 'a /dst3/b')
+
+    def test_deep_apply_sharing(self):
+
+        map_ = DirMap({'/src': '/dst'})
+
+        obj = {
+            'same': ['/other', ('/other', set(['a']))],
+            'changed': ['/other', ('/src/a', )],
+        }
+        x = map_.deep_apply(obj)
+        self.assertEqual(x, {
+            'same': ['/other', ('/other', set(['a']))],
+            'changed': ['/other', ('/dst/a', )],
+        })
+        self.assertIsNot(x, obj)
+        self.assertIs(x['same'], obj['same'])
+        self.assertIsNot(x['changed'], obj['changed'])
+
+        self.assertIs(map_.deep_apply(obj['same']), obj['same'])
+
+        # Shared references stay shared.
+        shared = ['/src']
+        x = map_.deep_apply([shared, shared])
+        self.assertIs(x[0], x[1])
+
+        # Recursion through a tuple.
+        a = ['/src']
+        a.append((a, ))
+        b = map_.deep_apply(a)
+        self.assertEqual(b[0], '/dst')
+        self.assertIs(b[1][0], b)
+
+    def test_deep_apply_depth(self):
+
+        map_ = DirMap({'/src': '/dst'})
+
+        obj = inner = []
+        for i in range(100000):
+            inner.append([])
+            inner = inner[0]
+        self.assertIs(map_.deep_apply(obj), obj)
+
+        inner.append('/src')
+        x = map_.deep_apply(obj)
+        for i in range(100000):
+            x = x[0]
+        self.assertEqual(x, ['/dst'])
+
+    def test_deep_apply_inplace(self):
+
+        map_ = DirMap({'/src': '/dst'})
+
+        list_ = ['/src/a', '/other']
+        set_ = set(['/src/b', '/other'])
+        tuple_ = ('/other', )
+        changed_tuple = ('/src/c', )
+        obj = {
+            '/src/key': list_,
+            'set': set_,
+            'tuple': tuple_,
+            'changed_tuple': changed_tuple,
+        }
+
+        x = map_.deep_apply(obj, inplace=True, dict_keys=True)
+        self.assertIs(x, obj)
+        self.assertEqual(obj, {
+            '/dst/key': ['/dst/a', '/other'],
+            'set': set(['/dst/b', '/other']),
+            'tuple': ('/other', ),
+            'changed_tuple': ('/dst/c', ),
+        })
+        self.assertIs(obj['/dst/key'], list_)
+        self.assertIs(obj['set'], set_)
+        self.assertIs(obj['tuple'], tuple_)
+        self.assertIsNot(obj['changed_tuple'], changed_tuple)
+
+        # Recursion
+        a = {}
+        a['/src'] = a
+        a['list'] = [a, '/src']
+        b = map_.deep_apply(a, dict_keys=True, inplace=True)
+        self.assertIs(b, a)
+        self.assertEqual(sorted(a), ['/dst', 'list'])
+        self.assertIs(a['/dst'], a)
+        self.assertIs(a['list'][0], a)
+        self.assertEqual(a['list'][1], '/dst')
+
+    def test_string_types(self):
+
+        class PathLike(object):
+            def __init__(self, path):
+                self.path = path
+            def __fspath__(self):
+                return self.path
+
+        old_encoding = core._fs_encoding
+        core._fs_encoding = 'utf-8'
+        self.addCleanup(setattr, core, '_fs_encoding', old_encoding)
+
+        for kwargs in {}, {'cache_size': 10}, {'dir_cache': True}:
+
+            map_ = DirMap({'/src': '/dst/\xc3\xa9'}, **kwargs)
+
+            for i in range(2):
+                x = map_(u'/src/a')
+                self.assertIs(type(x), unicode)
+                self.assertEqual(x, u'/dst/\xe9/a')
+                x = map_('/src/a')
+                self.assertIs(type(x), str)
+                self.assertEqual(x, '/dst/\xc3\xa9/a')
+
+            self.assertEqual(map_(u'/src'), u'/dst/\xe9')
+            self.assertIs(type(map_(u'/src')), unicode)
+
+            self.assertEqual(map_.apply_many([u'/src/b', '/src/b']), [u'/dst/\xe9/b', '/dst/\xc3\xa9/b'])
+            self.assertEqual(map_(u'x /src/c', embedded=True), u'x /dst/\xe9/c')
+
+            x = map_(PathLike('/src/d'))
+            self.assertIsInstance(x, PathLike)
+            self.assertEqual(x.path, '/dst/\xc3\xa9/d')
+            self.assertEqual(map_.apply_many([PathLike(u'/src/e')])[0].path, u'/dst/\xe9/e')
+
+            unchanged = PathLike('/other')
+            self.assertIs(map_(unchanged), unchanged)
+
+            self.assertRaises(ValueError, map_, 123)
+
+        # Sources which only equal the paths once converted.
+        for kwargs in {}, {'dir_cache': True}:
+            map_ = DirMap({'/caf\xc3\xa9': '/dst'}, **kwargs)
+            self.assertEqual(map_(u'/caf\xe9'), u'/dst')
+            self.assertEqual(map_.apply_many([u'/caf\xe9', u'/caf\xe9/a']), [u'/dst', u'/dst/a'])
+        frozen = DirMap({u'/caf\xe9': u'/dst'}).freeze()
+        self.assertEqual(frozen.apply_many(['/caf\xc3\xa9', '/caf\xc3\xa9/a']), ['/dst', '/dst/a'])
+
+    def test_freeze(self):
+
+        import pickle
+        import threading
+
+        for engine in sorted(engines):
+
+            map_ = DirMap(dict(('/src/{}'.format(i), '/dst/{}'.format(i)) for i in range(20)), engine=engine)
+            map_.add('/src/1/deep', '/elsewhere')
+            frozen = map_.freeze()
+            self.assertIs(frozen.freeze(), frozen)
+
+            for path in '/src/1/a', '/src/1/deep/b', '/src/12', '/src/123', '/other', 'src/1', '':
+                self.assertEqual(frozen(path), map_(path))
+            self.assertEqual(frozen(u'/src/2/a'), u'/dst/2/a')
+            self.assertEqual(frozen('x /src/3/a', embedded=True), 'x /dst/3/a')
+
+            paths = ['/src/1/a', '/src/1/b', '/src/1', '/other/a', '/src/1/deep']
+            self.assertEqual(frozen.apply_many(paths), map_.apply_many(paths))
+            self.assertEqual(frozen.deep_apply({'a': ['/src/4/a']}), {'a': ['/dst/4/a']})
+
+            self.assertEqual(dict(frozen), dict(map_))
+            self.assertEqual(frozen['/src/5'], '/dst/5')
+
+            clone = pickle.loads(pickle.dumps(frozen, pickle.HIGHEST_PROTOCOL))
+            self.assertEqual(clone, frozen)
+            self.assertEqual(hash(clone), hash(frozen))
+            self.assertEqual(clone('/src/6/a'), '/dst/6/a')
+
+        # Changing the original does not change the snapshot.
+        map_.add('/src/1', '/changed')
+        self.assertEqual(frozen('/src/1/a'), '/dst/1/a')
+        self.assertNotEqual(map_.freeze(), frozen)
+
+        self.assertRaises(AttributeError, setattr, frozen, '_map', {})
+        self.assertRaises(NotImplementedError, frozen.get, '/src/1')
+        self.assertEqual(DirMap().freeze()('/src/a'), '/src/a')
+
+        # Shared between threads.
+        errors = []
+        def work():
+            for i in range(1000):
+                if frozen('/src/7/{}'.format(i)) != '/dst/7/{}'.format(i):
+                    errors.append(i)
+        threads = [threading.Thread(target=work) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+
+    def test_batch(self):
+
+        import pickle
+        import threading
+
+        map_ = DirMap({'/src': '/dst'}, cache_size=10)
+        self.assertEqual(map_('/a/x'), '/a/x')
+
+        with map_.batch():
+            map_.add_one('/a', '/b')
+            with map_.batch():
+                map_.add('/c', '/d')
+            # Nothing is visible until the outermost batch is done.
+            self.assertEqual(map_('/a/x'), '/a/x')
+            self.assertNotIn('/c', map_)
+        self.assertEqual(map_('/a/x'), '/b/x')
+        self.assertEqual(map_('/c/x'), '/d/x')
+
+        # Failed batches change nothing.
+        def fail():
+            with map_.batch():
+                map_.add_one('/e', '/f')
+                raise RuntimeError()
+        self.assertRaises(RuntimeError, fail)
+        self.assertNotIn('/e', map_)
+        self.assertRaises(ValueError, map_.add_str, '/e:/f;/g:/h:/i')
+        self.assertNotIn('/e', map_)
+
+        # Readers see all of a batch or none of it.
+        map_ = DirMap({'/src': '/dst'})
+        torn = []
+        done = []
+        def read():
+            while not done:
+                a, b = map_.apply_many(['/a/x', '/b/x'])
+                if (a == '/a/x') != (b == '/b/x'):
+                    torn.append((a, b))
+        readers = [threading.Thread(target=read) for i in range(4)]
+        for t in readers:
+            t.start()
+        for i in range(200):
+            with map_.batch():
+                map_.add_one('/a', '/a{}'.format(i))
+                map_.add_one('/b', '/b{}'.format(i))
+        done.append(True)
+        for t in readers:
+            t.join()
+        self.assertEqual(torn, [])
+        self.assertEqual(map_('/b/x'), '/b199/x')
+
+        clone = pickle.loads(pickle.dumps(map_))
+        self.assertEqual(dict(clone), dict(map_))
+        self.assertEqual(clone('/b/x'), '/b199/x')
+
+    def test_reverse(self):
+
+        map_ = DirMap({'/src': '/dst', '/src/deep': '/dst2', '/other': '/dst2/other'})
+        for path in '/src/a', '/src/deep/b', '/other/c', '/unmapped':
+            self.assertEqual(map_.reverse(map_(path)), path)
+        self.assertEqual(map_.reverse(u'/dst/a'), u'/src/a')
+        self.assertEqual(map_.reverse('relative/dst'), 'relative/dst')
+
+        # The shortest source wins, and then the first.
+        map_ = DirMap({'/long/src': '/dst', '/b': '/dst', '/a': '/dst'})
+        self.assertIsNone(map_._state.inverse)
+        self.assertEqual(map_.reverse('/dst/x'), '/a/x')
+        self.assertEqual(map_.inverse()('/dst/x'), '/a/x')
+
+        # Follows changes.
+        map_.add_one('/a', '/elsewhere')
+        self.assertEqual(map_.reverse('/dst/x'), '/b/x')
+        self.assertEqual(map_.reverse('/elsewhere/x'), '/a/x')
+        map_.add_one('/b', '/elsewhere2')
+        self.assertEqual(map_.reverse('/dst/x'), '/long/src/x')
+        self.assertEqual(map_._state.sources, {})
+        map_.add_one('/long/src', '/dst3')
+        self.assertEqual(map_.reverse('/dst/x'), '/dst/x')
+        self.assertNotIn('/dst', map_.inverse())
+
+    def test_remove(self):
+
+        map_ = DirMap({'/src': '/dst', '/src/deep': '/dst2', '/a': '/dst', '/b': '/dst'}, cache_size=10)
+        self.assertEqual(map_('/src/deep/x'), '/dst2/x')
+        self.assertEqual(map_.reverse('/dst/x'), '/a/x')
+
+        map_.remove('/src/deep')
+        self.assertEqual(map_('/src/deep/x'), '/dst/deep/x')
+        self.assertNotIn('/src/deep', map_)
+        self.assertRaises(KeyError, map_.remove, '/src/deep')
+        map_.discard('/src/deep')
+
+        map_.remove('/a')
+        self.assertEqual(map_.reverse('/dst/x'), '/b/x')
+        map_.remove('/b')
+        self.assertEqual(map_.reverse('/dst/x'), '/src/x')
+        map_.discard('/src')
+        self.assertEqual(map_('/src/x'), '/src/x')
+        self.assertEqual(map_.reverse('/dst/x'), '/dst/x')
+        self.assertEqual(len(map_), 0)
+
+        with map_.batch():
+            map_.add_one('/c', '/d')
+            map_.remove('/c')
+        self.assertEqual(map_('/c/x'), '/c/x')
+
+    def test_incremental(self):
+
+        rules = dict(('/src/{}'.format(i), '/dst/{}'.format(i)) for i in range(50))
+        for engine in sorted(engines):
+
+            map_ = DirMap(rules, engine=engine, dir_cache=True)
+            self.assertEqual(map_('/src/1/a'), '/dst/1/a')
+            self.assertEqual(map_.reverse('/dst/1/a'), '/src/1/a')
+
+            # Interleaved changes and lookups.
+            for i in range(50, 100):
+                map_.add_one('/src/{}'.format(i), '/dst/{}'.format(i))
+                self.assertEqual(map_('/src/{}/a'.format(i)), '/dst/{}/a'.format(i))
+                map_.discard('/src/{}'.format(i - 50))
+                self.assertEqual(map_('/src/{}/a'.format(i - 50)), '/src/{}/a'.format(i - 50))
+                self.assertEqual(map_.reverse('/dst/{}/a'.format(i)), '/src/{}/a'.format(i))
+            map_.add_one('/src/75/deep', '/deep')
+            map_.add_one('/src', '/top')
+
+            expected = DirMap(dict(map_), engine=engine)
+            paths = ['/src/{}/a'.format(i) for i in range(0, 100, 7)] + ['/src/75/deep/b', '/src/x']
+            self.assertEqual(map_.apply_many(paths), expected.apply_many(paths), engine)
+            self.assertEqual(map_(u'/src/75/a'), u'/dst/75/a')
+
+        # Tries are changed rather than rebuilt, and share what didn't change.
+        map_ = DirMap(rules, engine='trie')
+        map_('/src/1')
+        before = map_._state.index()
+        map_.add_one('/other/a', '/b')
+        after = map_._state.index()
+        self.assertIsNot(after, before)
+        self.assertIs(after._trie[''].get('src'), before._trie['']['src'])
+        self.assertIsNone(before.match('/other/a'))
+
+        map_.remove('/other/a')
+        self.assertNotIn('other', map_._state.index()._trie[''])
+
+        # Nodes and rules too many to copy cheaply are only copied in part,
+        # but still dump as builtin types.
+        import marshal
+        rules = dict(('/big/{}'.format(i), '/dst') for i in range(2000))
+        for cls in TrieEngine, DictEngine:
+            engine = cls(rules, '/').changed({'/big/x': '/x'}, ['/big/1'])
+            self.assertEqual(engine.match('/big/x/y'), ('/x', 6))
+            self.assertEqual(engine.match('/big/2'), ('/dst', 6))
+            self.assertIsNone(engine.match('/big/1'))
+            clone = cls.load(marshal.loads(marshal.dumps(engine.dump())))
+            self.assertEqual(clone.match('/big/x/y'), ('/x', 6))
+            self.assertIsNone(clone.match('/big/1'))
+        self.assertIsInstance(engine._rules, PersistentDict)
+
+    def test_bulk_load(self):
+
+        map_ = DirMap({'/src': '/dst'})
+        map_('/src')
+        map_.bulk_load(('/src/{}'.format(i), '/dst{}'.format(i)) for i in range(1000))
+        self.assertEqual(len(map_), 1001)
+        self.assertEqual(map_('/src/500/a'), '/dst500/a')
+        self.assertEqual(map_('/src/x'), '/dst/x')
+
+        map_.bulk_load({'/a': '/b'})
+        self.assertEqual(map_('/a/x'), '/b/x')
+
+        # All or nothing.
+        self.assertRaises(ValueError, map_.bulk_load, [('/c', '/d'), ('relative', '/e')])
+        self.assertNotIn('/c', map_)
@@ -0,0 +1,63 @@
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+
+from dirmap import diskcache
+from dirmap import probe
+from dirmap.engines import engines
+
+
+class TestDiskCache(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.cache_dir = os.path.join(self.root, 'cache')
+        probe.clear_cache()
+        self.addCleanup(probe.clear_cache)
+
+    def entries(self):
+        return sorted(os.listdir(self.cache_dir))
+
+    def test_roundtrip(self):
+
+        spec = ';'.join('/src/{0}:/dst/{0}'.format(i) for i in range(20))
+
+        for engine in sorted(engines):
+            built = diskcache.load(spec, engine, cache_dir=self.cache_dir)
+            loaded = diskcache.load(spec, engine, cache_dir=self.cache_dir)
+            self.assertEqual(loaded, built)
+            self.assertEqual(loaded('/src/1/a'), '/dst/1/a')
+            self.assertEqual(loaded('/src/12/a'), '/dst/12/a')
+            self.assertEqual(loaded('/other'), '/other')
+
+        self.assertEqual(len(self.entries()), len(engines))
+
+    def test_mount_state(self):
+
+        a = os.path.join(self.root, 'a')
+        b = os.path.join(self.root, 'b')
+        spec = '{},{}'.format(a, b)
+
+        os.mkdir(a)
+        self.assertEqual(dict(diskcache.load(spec, cache_dir=self.cache_dir)), {b: a})
+
+        os.rmdir(a)
+        os.mkdir(b)
+        probe.clear_cache()
+        self.assertEqual(dict(diskcache.load(spec, cache_dir=self.cache_dir)), {a: b})
+        self.assertEqual(len(self.entries()), 2)
+
+    def test_bad_entries(self):
+
+        map_ = diskcache.load('/src:/dst', cache_dir=self.cache_dir)
+        entry, = self.entries()
+        with open(os.path.join(self.cache_dir, entry), 'wb') as fh:
+            fh.write('garbage')
+        self.assertEqual(diskcache.load('/src:/dst', cache_dir=self.cache_dir), map_)
+
+        # Unwritable caches still work.
+        path = os.path.join(self.root, 'file')
+        open(path, 'w').close()
+        self.assertEqual(diskcache.load('/src:/dst', cache_dir=path), map_)
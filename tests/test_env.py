@@ -0,0 +1,57 @@
+from unittest import TestCase
+import os
+import subprocess
+import sys
+
+import dirmap
+from dirmap import env
+
+
+class TestEnv(TestCase):
+
+    def setUp(self):
+        self.old = os.environ.get('DIRMAP')
+        self.addCleanup(self.restore)
+        env.reset()
+
+    def restore(self):
+        if self.old is None:
+            os.environ.pop('DIRMAP', None)
+        else:
+            os.environ['DIRMAP'] = self.old
+        env.reset()
+
+    def test_default(self):
+
+        os.environ['DIRMAP'] = '/src:/dst;/src2:/dst2'
+        self.assertEqual(dirmap.apply('/src/a'), '/dst/a')
+        self.assertEqual(dict(dirmap.default()), {'/src': '/dst', '/src2': '/dst2'})
+        self.assertIs(dirmap.default(), dirmap.default())
+
+        # Only read once.
+        os.environ['DIRMAP'] = '/src:/elsewhere'
+        self.assertEqual(dirmap.apply('/src/a'), '/dst/a')
+        env.reset()
+        self.assertEqual(dirmap.apply('/src/a'), '/elsewhere/a')
+
+        del os.environ['DIRMAP']
+        env.reset()
+        self.assertEqual(dirmap.apply('/src/a'), '/src/a')
+        self.assertEqual(len(dirmap.default()), 0)
+
+    def test_lazy(self):
+
+        # Importing doesn't read the environment, nor build anything.
+        code = 'import dirmap, dirmap.env, sys; sys.stdout.write(repr(dirmap.env._default))'
+        path = os.path.dirname(os.path.dirname(os.path.abspath(dirmap.__file__)))
+        out = subprocess.check_output(
+            [sys.executable, '-c', code],
+            env=dict(os.environ, DIRMAP='/src:/dst', PYTHONPATH=path),
+        )
+        self.assertEqual(out, 'None')
+
+        # Nor is the index compiled until the first lookup.
+        os.environ['DIRMAP'] = '/src:/dst'
+        self.assertEqual(dirmap.default()._state.indexes, {})
+        dirmap.apply('/src/a')
+        self.assertIn(str, dirmap.default()._state.indexes)
@@ -0,0 +1,164 @@
+from unittest import TestCase
+
+from dirmap import DirMap
+from dirmap.engines import engines
+import dirmap.flavors
+from dirmap.flavors import flavors, get_flavor, native
+
+
+class TestFlavors(TestCase):
+
+    def test_get_flavor(self):
+        self.assertIs(get_flavor(), native)
+        self.assertIs(get_flavor('nt'), flavors['nt'])
+        self.assertIs(get_flavor(flavors['nt']), flavors['nt'])
+        self.assertRaises(ValueError, get_flavor, 'vms')
+
+    def test_nt_to_posix(self):
+
+        for kwargs in {}, {'cache_size': 10}, {'dir_cache': True}:
+
+            map_ = DirMap({
+                'Z:\\Projects': '/mnt/projects',
+                'Z:\\Projects\\Big': '/mnt/big',
+                '\\\\server\\share': '/mnt/share',
+            }, flavor='nt', dst_flavor='posix', **kwargs)
+
+            self.assertEqual(map_('Z:\\Projects\\Foo\\bar.ma'), '/mnt/projects/Foo/bar.ma')
+            self.assertEqual(map_('z:\\PROJECTS\\Foo\\bar.ma'), '/mnt/projects/Foo/bar.ma')
+            self.assertEqual(map_('Z:/Projects/Foo/bar.ma'), '/mnt/projects/Foo/bar.ma')
+            self.assertEqual(map_('Z:\\projects\\big\\Foo'), '/mnt/big/Foo')
+            self.assertEqual(map_(u'Z:\\Projects\\Foo'), u'/mnt/projects/Foo')
+            self.assertEqual(map_('Z:\\Projects'), '/mnt/projects')
+            self.assertEqual(map_('\\\\SERVER\\share\\a'), '/mnt/share/a')
+            self.assertEqual(map_('Z:\\ProjectsX\\a'), 'Z:\\ProjectsX\\a')
+            self.assertEqual(map_('Y:\\Projects\\a'), 'Y:\\Projects\\a')
+            self.assertEqual(map_('relative\\a'), 'relative\\a')
+
+            paths = ['Z:\\Projects\\a', 'z:\\projects\\b', 'Z:\\Other\\c']
+            self.assertEqual(map_.apply_many(paths), ['/mnt/projects/a', '/mnt/projects/b', 'Z:\\Other\\c'])
+            self.assertEqual(
+                map_('copy z:\\projects\\a\\b.ma Z:/Projects/c, x\\y', embedded=True),
+                'copy /mnt/projects/a/b.ma /mnt/projects/c, x\\y',
+            )
+
+            self.assertEqual(map_.reverse('/mnt/projects/Foo/bar.ma'), 'Z:\\Projects\\Foo\\bar.ma')
+            self.assertEqual(map_.inverse()('/mnt/big/a'), 'Z:\\Projects\\Big\\a')
+
+        self.assertRaises(ValueError, map_.add_one, 'Z:/Unclean', '/mnt/x')
+        self.assertRaises(ValueError, map_.add_one, 'Z:\\Src', 'relative')
+        self.assertRaises(ValueError, map_.freeze)
+
+    def test_posix_ci(self):
+
+        map_ = DirMap({'/Volumes/CGroot': '/mnt/CGroot'}, flavor='posix-ci')
+        self.assertEqual(map_('/volumes/cgroot/Foo/Bar'), '/mnt/CGroot/Foo/Bar')
+        self.assertEqual(map_('/Volumes/CGroot'), '/mnt/CGroot')
+        self.assertEqual(map_('/Volumes/CGrootX'), '/Volumes/CGrootX')
+        self.assertEqual(map_.reverse('/MNT/cgroot/a'), '/Volumes/CGroot/a')
+
+        # Only the sources are case-insensitive by default.
+        map_ = DirMap({'/Volumes/CGroot': '/mnt/CGroot'}, flavor='posix-ci', dst_flavor='posix')
+        self.assertEqual(map_.reverse('/MNT/cgroot/a'), '/MNT/cgroot/a')
+
+        self.assertRaises(ValueError, map_.freeze)
+
+    def test_freeze_native_nt(self):
+        # Frozen maps don't fold paths, so can't be used on Windows either.
+        old_native = dirmap.flavors.native
+        dirmap.flavors.native = flavors['nt']
+        try:
+            map_ = DirMap({'Z:\\Src': 'Z:\\Dst'})
+            self.assertEqual(map_('z:\\src\\a'), 'Z:\\Dst\\a')
+            self.assertRaises(ValueError, map_.freeze)
+        finally:
+            dirmap.flavors.native = old_native
+
+    def test_roots(self):
+
+        # Sources and destinations which are a whole drive or UNC share.
+        for engine in sorted(engines):
+            for kwargs in {}, {'cache_size': 10}, {'dir_cache': True}:
+
+                map_ = DirMap({
+                    'Z:\\': '/mnt/z',
+                    'Z:\\Deep\\Dir': '/mnt/deep',
+                    '\\\\server\\share\\': '/mnt/share',
+                }, flavor='nt', dst_flavor='posix', engine=engine, **kwargs)
+
+                paths = [
+                    'Z:\\a\\b', 'z:/a/b', 'Z:\\', 'Z:\\deep\\dir\\c', 'Z:', 'Y:\\a',
+                    '\\\\SERVER\\share\\a\\b', '\\\\server\\share\\', '\\\\server\\share',
+                    '\\\\server\\shared\\a',
+                ]
+                expected = [
+                    '/mnt/z/a/b', '/mnt/z/a/b', '/mnt/z', '/mnt/deep/c', 'Z:', 'Y:\\a',
+                    '/mnt/share/a/b', '/mnt/share', '/mnt/share',
+                    '\\\\server\\shared\\a',
+                ]
+                self.assertEqual([map_(p) for p in paths], expected, engine)
+                self.assertEqual(map_.apply_many(paths), expected, engine)
+                self.assertEqual(map_(' '.join(paths), embedded=True), ' '.join(expected), engine)
+
+                self.assertEqual(map_.reverse('/mnt/z/a/b'), 'Z:\\a\\b')
+                self.assertEqual(map_.reverse('/mnt/z'), 'Z:\\')
+                self.assertEqual(map_.reverse('/mnt/share/a'), '\\\\server\\share\\a')
+
+                map_ = DirMap({
+                    '/mnt/z': 'Z:\\',
+                    '/mnt/share': '\\\\server\\share\\',
+                }, dst_flavor='nt', engine=engine, **kwargs)
+
+                paths = ['/mnt/z/a/b', '/mnt/z', '/mnt/z/', '/mnt/share/a', '/mnt/share', '/mnt/zz']
+                expected = ['Z:\\a\\b', 'Z:\\', 'Z:\\', '\\\\server\\share\\a', '\\\\server\\share\\', '/mnt/zz']
+                self.assertEqual([map_(p) for p in paths], expected, engine)
+                self.assertEqual(map_.apply_many(paths), expected, engine)
+                self.assertEqual(map_(' '.join(paths), embedded=True), ' '.join(expected), engine)
+
+                self.assertEqual(map_.reverse('Z:\\a\\b'), '/mnt/z/a/b')
+                self.assertEqual(map_.reverse('z:/a'), '/mnt/z/a')
+                self.assertEqual(map_.reverse('Z:\\'), '/mnt/z')
+                self.assertEqual(map_.reverse('\\\\SERVER\\Share\\a'), '/mnt/share/a')
+
+        # A share with and without its separator is the same source.
+        map_ = DirMap({'\\\\server\\share': '/mnt/a'}, flavor='nt', dst_flavor='posix')
+        map_.add_one('\\\\server\\share\\', '/mnt/b')
+        self.assertEqual(dict(map_), {'\\\\server\\share\\': '/mnt/b'})
+        self.assertEqual(map_('\\\\server\\share\\c'), '/mnt/b/c')
+
+    def test_changes(self):
+
+        map_ = DirMap({'Z:\\Projects': '/mnt/projects'}, flavor='nt', dst_flavor='posix', dir_cache=True)
+        self.assertEqual(map_('z:\\projects\\a'), '/mnt/projects/a')
+        self.assertEqual(map_.reverse('/mnt/projects/a'), 'Z:\\Projects\\a')
+
+        # Sources differing only by case are the same source.
+        map_.add_one('z:\\PROJECTS', '/mnt/new')
+        self.assertEqual(dict(map_), {'z:\\PROJECTS': '/mnt/new'})
+        self.assertEqual(map_('Z:\\Projects\\a'), '/mnt/new/a')
+        self.assertEqual(map_.reverse('/mnt/new/a'), 'z:\\PROJECTS\\a')
+        self.assertEqual(map_.reverse('/mnt/projects/a'), '/mnt/projects/a')
+
+        map_.remove('Z:/Projects')
+        self.assertEqual(len(map_), 0)
+        self.assertEqual(map_('Z:\\Projects\\a'), 'Z:\\Projects\\a')
+
+        map_ = DirMap({'/Src': '/Dst', '/Other': '/DST'}, flavor='posix-ci')
+        self.assertIn(map_.reverse('/dst/a'), ('/Src/a', '/Other/a'))
+        map_.remove('/other')
+        self.assertEqual(map_.reverse('/dst/a'), '/Src/a')
+
+    def test_add_str(self):
+
+        map_ = DirMap(flavor='nt', dst_flavor='posix')
+        map_.add_str('Z:\\Projects:/mnt/projects;\\\\server\\share:/mnt/share;Y:\\Data:/mnt/y;y:\\Data2:/mnt/y2')
+        self.assertEqual(dict(map_), {
+            'Z:\\Projects': '/mnt/projects',
+            '\\\\server\\share': '/mnt/share',
+            'Y:\\Data': '/mnt/y',
+            'y:\\Data2': '/mnt/y2',
+        })
+
+        map_ = DirMap(dst_flavor='nt')
+        map_.add_str('/mnt/projects:Z:\\Projects')
+        self.assertEqual(map_('/mnt/projects/a/b'), 'Z:\\Projects\\a\\b')
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+from StringIO import StringIO
+from unittest import TestCase
+import json
+
+from dirmap import DirMap
+from dirmap import json_stream
+
+
+class TestJSONStream(TestCase):
+
+    def setUp(self):
+        self.map_ = DirMap({'/src': '/dst', '/quoted': '/with "quotes"'})
+
+    def remap(self, input_, chunk_size=None, **kwargs):
+        out = StringIO()
+        old_chunk_size = json_stream.chunk_size
+        json_stream.chunk_size = chunk_size or old_chunk_size
+        try:
+            json_stream.remap(self.map_, StringIO(input_), out, **kwargs)
+        finally:
+            json_stream.chunk_size = old_chunk_size
+        return out.getvalue()
+
+    def test_remap(self):
+
+        doc = {
+            '/src/key': ['/src/a', '/other', 1.5, None, True, {'nested': '/src'}],
+            'escaped': '/src/\\"b\\u00e9\\"',
+            'unicode': u'/src/é',
+            'quoted': '/quoted/c',
+            'cmd': 'render -o /src/out',
+        }
+        input_ = json.dumps(doc, indent=4)
+
+        for chunk_size in None, 1, 7:
+
+            out = self.remap(input_, chunk_size)
+            self.assertEqual(json.loads(out), self.map_.deep_apply(json.loads(input_)))
+
+            out = self.remap(input_, chunk_size, dict_keys=True, embedded=True)
+            self.assertEqual(
+                json.loads(out),
+                self.map_.deep_apply(json.loads(input_), dict_keys=True, embedded=True),
+            )
+
+    def test_unchanged_bytes(self):
+        input_ = '{"a" : [ "/other\\/x", 1e5,"\\u0041"] ,\n"b":"/src"}'
+        self.assertEqual(self.remap(input_), input_.replace('"/src"', '"/dst"'))
+        self.assertEqual(self.remap(input_, chunk_size=3), input_.replace('"/src"', '"/dst"'))
+
+    def test_keys(self):
+        self.assertEqual(self.remap('{"/src": "/src"}'), '{"/src": "/dst"}')
+        self.assertEqual(self.remap('{"/src"  :"/src"}', dict_keys=True), '{"/dst"  :"/dst"}')
+        self.assertEqual(self.remap('"/src"'), '"/dst"')
+
+    def test_unterminated(self):
+        self.assertRaises(ValueError, self.remap, '["/src')
+        self.assertRaises(ValueError, self.remap, '["/src\\"]')
@@ -0,0 +1,51 @@
+from unittest import TestCase
+
+from dirmap import DirMap
+from dirmap import parallel
+
+
+class TestParallel(TestCase):
+
+    def setUp(self):
+        self.map_ = DirMap({'/src': '/dst'})
+        self.old_threshold = parallel.threshold
+        parallel.threshold = 10
+
+    def tearDown(self):
+        parallel.threshold = self.old_threshold
+
+    def test_list(self):
+
+        obj = [{'path': '/src/{}'.format(i), 'other': ['/other']} for i in range(100)]
+        serial = self.map_.deep_apply(obj)
+        self.assertEqual(self.map_.deep_apply(obj, jobs=2), serial)
+        self.assertEqual(self.map_.deep_apply(tuple(obj), jobs=2), tuple(serial))
+
+        # Nothing changes.
+        obj = [['/other/{}'.format(i)] for i in range(100)]
+        self.assertIs(self.map_.deep_apply(obj, jobs=2), obj)
+
+        # In place.
+        obj = ['/src/{}'.format(i) for i in range(100)]
+        self.assertIs(self.map_.deep_apply(obj, jobs=2, inplace=True), obj)
+        self.assertEqual(obj, ['/dst/{}'.format(i) for i in range(100)])
+
+    def test_dict(self):
+
+        obj = dict(('/src/{}'.format(i), ['/src/{}'.format(i)]) for i in range(100))
+        for dict_keys in False, True:
+            serial = self.map_.deep_apply(obj, dict_keys=dict_keys)
+            self.assertEqual(self.map_.deep_apply(obj, jobs=2, dict_keys=dict_keys), serial)
+
+        self.assertIs(self.map_.deep_apply(obj, jobs=2, dict_keys=True, inplace=True), obj)
+        self.assertEqual(obj, dict(('/dst/{}'.format(i), ['/dst/{}'.format(i)]) for i in range(100)))
+
+    def test_small(self):
+        obj = ['/src']
+        self.assertEqual(self.map_.deep_apply(obj, jobs=2), ['/dst'])
+
+    def test_flavors(self):
+        # These can't be frozen, so are sent to the workers as they are.
+        map_ = DirMap({'Z:\\Src': '/dst'}, flavor='nt', dst_flavor='posix')
+        obj = ['z:\\src\\{}'.format(i) for i in range(100)]
+        self.assertEqual(map_.deep_apply(obj, jobs=2), ['/dst/{}'.format(i) for i in range(100)])
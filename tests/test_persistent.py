@@ -0,0 +1,77 @@
+from unittest import TestCase
+import pickle
+import random
+
+from dirmap.persistent import PersistentDict
+
+
+class TestPersistentDict(TestCase):
+
+    def test_basics(self):
+
+        d = PersistentDict({'a': 1})
+        d['b'] = 2
+        d['a'] = 3
+        self.assertEqual(len(d), 2)
+        self.assertEqual(d['a'], 3)
+        self.assertEqual(d.get('c'), None)
+        self.assertEqual(d.get('c', 4), 4)
+        self.assertIn('b', d)
+        self.assertNotIn('c', d)
+        self.assertRaises(KeyError, d.__getitem__, 'c')
+
+        self.assertEqual(d.pop('b'), 2)
+        self.assertEqual(d.pop('b', None), None)
+        self.assertRaises(KeyError, d.pop, 'b')
+        self.assertEqual(d.setdefault('a', 5), 3)
+        self.assertEqual(d.setdefault('c', 5), 5)
+        del d['c']
+        self.assertRaises(KeyError, d.__delitem__, 'c')
+
+        self.assertEqual(d, {'a': 3})
+        self.assertEqual(dict(d), {'a': 3})
+        self.assertFalse(PersistentDict())
+        self.assertEqual(pickle.loads(pickle.dumps(d)), d)
+
+    def test_copies(self):
+
+        # Enough to split into many levels of branches.
+        rand = random.Random(0)
+        expected = dict((str(i), i) for i in xrange(5000))
+        d = PersistentDict(expected)
+        versions = [(d, dict(expected))]
+
+        for i in xrange(2000):
+            d = d.copy()
+            key = str(rand.randrange(8000))
+            if key in expected and rand.random() < 0.5:
+                del d[key]
+                del expected[key]
+            else:
+                d[key] = expected[key] = -i
+            versions.append((d, dict(expected)))
+
+        # No version was changed by those after it.
+        for d, expected in versions[::100] + versions[-1:]:
+            self.assertEqual(len(d), len(expected))
+            self.assertEqual(dict(d.iteritems()), expected)
+            self.assertEqual(sorted(d), sorted(expected))
+
+    def test_growth(self):
+        d = PersistentDict()
+        for i in xrange(3000):
+            d[i] = i
+            if i % 500 == 0:
+                copy = d.copy()
+        self.assertEqual(d, dict((i, i) for i in xrange(3000)))
+        self.assertEqual(copy, dict((i, i) for i in xrange(2501)))
+
+    def test_uneven(self):
+        # Integers hash to themselves, so these all share their lowest bits.
+        expected = dict((i << 5, i) for i in xrange(3000))
+        d = PersistentDict(expected)
+        self.assertEqual(d, expected)
+        self.assertEqual(d.get(32 * 2999), 2999)
+        d[1] = 1
+        self.assertEqual(d[1], 1)
+        self.assertEqual(len(d), 3001)
@@ -0,0 +1,77 @@
+from unittest import TestCase
+import os
+import threading
+import time
+
+from dirmap import DirMap
+from dirmap import probe
+
+
+class TestProbe(TestCase):
+
+    def setUp(self):
+
+        self.checked = []
+        self.hung = threading.Event()
+        self.addCleanup(self.hung.set)
+
+        test = self
+        class path(object):
+            @staticmethod
+            def exists(p):
+                test.checked.append(p)
+                if p.startswith('/hung'):
+                    test.hung.wait()
+                return p.startswith('/exists')
+        class fake_os(object):
+            pass
+        fake_os.path = path
+
+        probe.clear_cache()
+        self.addCleanup(probe.clear_cache)
+        probe.os = fake_os
+        self.addCleanup(setattr, probe, 'os', os)
+
+    def test_cache(self):
+
+        paths = ['/exists/a', '/missing/b', '/exists/a']
+        self.assertEqual(probe.exists_many(paths), {'/exists/a': True, '/missing/b': False})
+        self.assertEqual(probe.exists_many(paths), {'/exists/a': True, '/missing/b': False})
+        self.assertEqual(sorted(self.checked), ['/exists/a', '/missing/b'])
+
+        old_ttl = probe.ttl
+        probe.ttl = 0
+        self.addCleanup(setattr, probe, 'ttl', old_ttl)
+        probe.clear_cache()
+        probe.exists_many(['/exists/a'])
+        probe.exists_many(['/exists/a'])
+        self.assertEqual(self.checked.count('/exists/a'), 3)
+
+    def test_timeout(self):
+
+        start = time.time()
+        self.assertEqual(
+            probe.exists_many(['/hung/a', '/exists/b', '/hung/c'], timeout=0.1),
+            {'/hung/a': False, '/exists/b': True, '/hung/c': False},
+        )
+        self.assertLess(time.time() - start, 1)
+
+        # Timeouts are remembered, rather than waited on again.
+        start = time.time()
+        self.assertEqual(probe.exists_many(['/hung/a']), {'/hung/a': False})
+        self.assertLess(time.time() - start, 0.1)
+        self.assertEqual(self.checked.count('/hung/a'), 1)
+
+    def test_add_existing(self):
+
+        old_timeout = probe.default_timeout
+        probe.default_timeout = 0.1
+        self.addCleanup(setattr, probe, 'default_timeout', old_timeout)
+
+        map_ = DirMap()
+        map_.add_str('/hung/a,/exists/b,/missing/c')
+        self.assertEqual(dict(map_), {'/hung/a': '/exists/b', '/missing/c': '/exists/b'})
+
+        for i in range(100):
+            DirMap('/hung/a,/exists/b,/missing/c')
+        self.assertEqual(len(self.checked), 3)
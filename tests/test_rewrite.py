@@ -0,0 +1,104 @@
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+
+from dirmap import DirMap
+from dirmap import rewrite
+
+
+class TestRewrite(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.map_ = DirMap({
+            '/src': '/dst',
+            '/src/inner': '/dst2',
+            '/with spaces': '/without',
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, name, content):
+        path = os.path.join(self.root, name)
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as fh:
+            fh.write(content)
+        return path
+
+    def read(self, path):
+        with open(path, 'rb') as fh:
+            return fh.read()
+
+    def test_rewrite_file(self):
+
+        path = self.write('scene.ma', '\n'.join([
+            'file -r "/src/a.ma";',
+            'setAttr ".ftn" -type "string" "/src/inner/b.exr";',
+            '"/src"',
+            '/srcx/c /src.bak /src-2 /other/src/d x/src',
+            '/with spaces/e',
+            'cmd -file /src/f -proj /src/inner',
+        ]))
+
+        self.assertEqual(rewrite.rewrite_file(self.map_, path), 6)
+        self.assertEqual(self.read(path), '\n'.join([
+            'file -r "/dst/a.ma";',
+            'setAttr ".ftn" -type "string" "/dst2/b.exr";',
+            '"/dst"',
+            '/srcx/c /src.bak /src-2 /other/src/d x/src',
+            '/without/e',
+            'cmd -file /dst/f -proj /dst2',
+        ]))
+
+        # Nothing left to do.
+        self.assertEqual(rewrite.rewrite_file(self.map_, path), 0)
+
+    def test_rewrite_elsewhere(self):
+        src = self.write('a.txt', '/src/a')
+        dst = os.path.join(self.root, 'b.txt')
+        self.assertEqual(rewrite.rewrite_file(self.map_, src, dst), 1)
+        self.assertEqual(self.read(src), '/src/a')
+        self.assertEqual(self.read(dst), '/dst/a')
+
+    def test_chunked_copy(self):
+        content = 'x' * 1000 + ' /src/a ' + 'y' * 1000
+        path = self.write('a.txt', content)
+        old_chunk_size = rewrite.chunk_size
+        rewrite.chunk_size = 7
+        try:
+            rewrite.rewrite_file(self.map_, path)
+        finally:
+            rewrite.chunk_size = old_chunk_size
+        self.assertEqual(self.read(path), content.replace('/src', '/dst'))
+
+    def test_empty(self):
+        path = self.write('empty.txt', '')
+        self.assertEqual(rewrite.rewrite_file(self.map_, path), 0)
+        self.assertEqual(rewrite.rewrite_file(DirMap(), self.write('a.txt', '/src')), 0)
+
+    def test_flavors(self):
+        path = self.write('a.txt', '/src/a /SRC/b')
+        for map_ in (
+            DirMap({'/src': '/dst'}, flavor='posix-ci'),
+            DirMap({'/src': 'Z:\\dst'}, dst_flavor='nt'),
+        ):
+            self.assertRaises(ValueError, rewrite.rewrite_file, map_, path)
+            self.assertRaises(ValueError, list, rewrite.rewrite_paths(map_, [path]))
+        self.assertEqual(self.read(path), '/src/a /SRC/b')
+
+    def test_rewrite_paths(self):
+
+        a = self.write('scenes/a.ma', '/src/a')
+        b = self.write('scenes/sub/b.ma', '/src/b')
+        c = self.write('scenes/c.txt', '/src/c')
+
+        for jobs in None, 2:
+            results = list(rewrite.rewrite_paths(self.map_, [self.root], include=['*.ma'], jobs=jobs))
+            self.assertEqual(results, [(a, 1 if jobs is None else 0), (b, 1 if jobs is None else 0)])
+
+        self.assertEqual(self.read(a), '/dst/a')
+        self.assertEqual(self.read(b), '/dst/b')
+        self.assertEqual(self.read(c), '/src/c')
@@ -0,0 +1,65 @@
+from unittest import TestCase
+
+from dirmap import DirMap
+from dirmap.stats import Stats
+
+
+class TestStats(TestCase):
+
+    def test_counts(self):
+
+        map_ = DirMap({'/src': '/dst', '/src/deep': '/dst2', '/unused': '/dst3'})
+        stats = map_.instrument()
+
+        self.assertEqual(map_('/src/a'), '/dst/a')
+        self.assertEqual(map_(u'/src/deep/b'), u'/dst2/b')
+        self.assertEqual(map_.apply_many(['/src/c', '/other/d', '/other/e']), ['/dst/c', '/other/d', '/other/e'])
+        self.assertEqual(list(map_.iter_apply(iter(['/src/i', '/other/j']))), ['/dst/i', '/other/j'])
+        self.assertEqual(map_.deep_apply({'x': ['/src/f', '/more/g']}), {'x': ['/dst/f', '/more/g']})
+        self.assertEqual(map_('relative'), 'relative')
+        self.assertEqual(map_('x /src/h', embedded=True), 'x /dst/h')
+
+        self.assertEqual(stats.hits, {'/src': 4, '/src/deep': 1})
+        self.assertEqual(stats.misses, {'other': 3, 'more': 1})
+        self.assertEqual(stats.dead_rules(map_), ['/unused'])
+        self.assertEqual(stats.latency['apply_many'].count, 1)
+        self.assertEqual(stats.latency['deep_apply'].count, 1)
+
+        self.assertIs(map_.uninstrument(), stats)
+        self.assertIs(map_.uninstrument(), None)
+        map_('/src/a')
+        map_.apply_many(['/src/a'])
+        self.assertEqual(stats.hits['/src'], 4)
+        self.assertNotIn('_call', vars(map_))
+        self.assertNotIn('iter_apply', vars(map_))
+
+    def test_sampling(self):
+
+        timings = []
+        stats = Stats(sample_every=10, callback=lambda op, seconds: timings.append(op))
+
+        map_ = DirMap({'/src': '/dst'}, cache_size=10)
+        self.assertIs(map_.instrument(stats), stats)
+        for i in range(100):
+            map_('/src/a')
+
+        self.assertEqual(timings, ['call'] * 10)
+        self.assertEqual(stats.latency['call'].count, 10)
+        self.assertIsNotNone(stats.latency['call'].percentile(50))
+        self.assertEqual(stats.hits, {'/src': 100})
+
+    def test_flavors(self):
+
+        map_ = DirMap({'/Src': '/dst', '/Unused': '/dst2'}, flavor='posix-ci')
+        stats = map_.instrument()
+        self.assertEqual(map_.apply_many(['/SRC/a', '/src/b', '/Other/c']), ['/dst/a', '/dst/b', '/Other/c'])
+        self.assertEqual(stats.hits, {'/Src': 2})
+        self.assertEqual(stats.misses, {'Other': 1})
+        self.assertEqual(stats.dead_rules(map_), ['/Unused'])
+
+        map_ = DirMap({'Z:\\Projects': '/mnt/projects'}, flavor='nt', dst_flavor='posix')
+        stats = map_.instrument()
+        self.assertEqual(map_('z:/projects/a'), '/mnt/projects/a')
+        self.assertEqual(map_('Z:\\Other\\b'), 'Z:\\Other\\b')
+        self.assertEqual(stats.hits, {'Z:\\Projects': 1})
+        self.assertEqual(stats.misses, {'Other': 1})
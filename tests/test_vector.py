@@ -0,0 +1,73 @@
+from unittest import TestCase, skipIf
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from dirmap import DirMap
+
+
+@skipIf(numpy is None, "requires NumPy")
+class TestApplyArray(TestCase):
+
+    def test_basics(self):
+
+        map_ = DirMap({'/src': '/dst', '/src/deep': '/deeper/still', '/a': '/b'})
+        paths = [
+            '/src', '/src/x', '/src/deep/y', '/srcx/z', '/a/b/c', '/other',
+            'relative', '', '/src/deep',
+        ]
+
+        for dtype in 'S', 'U', object:
+            arr = numpy.array(paths, dtype=dtype)
+            out = map_.apply_array(arr)
+            self.assertEqual(out.dtype.kind, arr.dtype.kind)
+            self.assertEqual(list(out), map_.apply_many(list(arr)))
+
+        arr = numpy.array(paths[:6]).reshape(2, 3)
+        out = map_.apply_array(arr)
+        self.assertEqual(out.shape, (2, 3))
+        self.assertEqual(out[1, 1], '/b/b/c')
+
+    def test_objects(self):
+
+        map_ = DirMap({'/src': '/dst'})
+        arr = numpy.array(['/src/a', u'/src/b', None, 1.5, '/other'], dtype=object)
+        out = map_.apply_array(arr)
+        self.assertEqual(list(out), ['/dst/a', u'/dst/b', None, 1.5, '/other'])
+        self.assertIs(type(out[0]), str)
+        self.assertIs(type(out[1]), unicode)
+
+        self.assertRaises(TypeError, map_.apply_array, numpy.arange(3))
+
+    def test_empty(self):
+        arr = numpy.array(['/src/a'])
+        self.assertEqual(list(DirMap().apply_array(arr)), ['/src/a'])
+        self.assertEqual(len(DirMap({'/src': '/dst'}).apply_array(arr[:0])), 0)
+
+    def test_flavors(self):
+
+        map_ = DirMap({'Z:\\Projects': '/mnt/projects'}, flavor='nt', dst_flavor='posix')
+        paths = ['z:\\projects\\Foo\\bar.ma', 'Z:/PROJECTS/Foo', 'z:\\projectsx', 'Z:\\Projects']
+        out = map_.apply_array(numpy.array(paths))
+        self.assertEqual(list(out), map_.apply_many(paths))
+        self.assertEqual(out[0], '/mnt/projects/Foo/bar.ma')
+
+    def test_roots(self):
+
+        map_ = DirMap({'Z:\\': '/mnt/z', '\\\\server\\share\\': '/'}, flavor='nt', dst_flavor='posix')
+        paths = ['Z:\\a', 'z:/', 'Z:', '\\\\server\\share', '\\\\SERVER\\share\\b', 'Y:\\a']
+        out = map_.apply_array(numpy.array(paths))
+        self.assertEqual(list(out), ['/mnt/z/a', '/mnt/z', 'Z:', '/', '/b', 'Y:\\a'])
+
+        map_ = DirMap({'/': '/x', '/mnt': '/'})
+        paths = ['/', '/a', '/mnt', '/mnt/', '/mnt/b', 'relative', '']
+        out = map_.apply_array(numpy.array(paths))
+        self.assertEqual(list(out), ['/x', '/x/a', '/', '/', '/b', 'relative', ''])
+
+    def test_many_rules(self):
+
+        map_ = DirMap(dict(('/src/{:04d}'.format(i), '/dst/{}'.format(i)) for i in range(2000)))
+        paths = ['/src/{:04d}/file{}'.format(i * 7 % 2500, i) for i in range(1000)]
+        self.assertEqual(list(map_.apply_array(numpy.array(paths))), map_.apply_many(paths))